@@ -0,0 +1,734 @@
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+sys.path.append(path.dirname(SCRIPT_DIR))
+
+from reader.rss_cache import JsonLinesCache, ParquetSnapshot
+from reader.rss_dates import DateNormalizer, parse_dateutil
+from reader.rss_entities import RssReader
+from reader.rss_fetcher import FeedMemo, fetch_feed, fetch_feeds, parse_feed, parse_pool
+from reader.rss_model import Entry, Link
+from reader.rss_search import SearchIndex
+from reader.rss_export import BulkExporter, source_dir_name
+from reader.rss_server import RssServer
+from reader.rss_http import HttpClient
+from reader.rss_utils import pass_to_html, pass_to_pdf
+
+
+def generate_feed(entries=20, links=2, summary_length=200, title="Synthetic Feed", base_url="http://bench.local/",
+                  feed_format="rss"):
+    """
+    Generate a synthetic RSS 2.0 or Atom document
+    :param int entries: number of items
+    :param int links: number of links (the item link and enclosures) per item
+    :param int summary_length: length of the item description in characters
+    :param str title: title of the channel
+    :param str base_url: prefix of generated links
+    :param str feed_format: 'rss' or 'atom'
+    :return: rss document in bytes
+    """
+    published = datetime(2022, 9, 27, 12, 0, tzinfo=timezone(timedelta(hours=3)))
+    summary = ("lorem ipsum " * (summary_length // 12 + 1))[:summary_length]
+    items = []
+    for number in range(entries):
+        if feed_format == "atom":
+            enclosures = "".join(f'<link rel="enclosure" href="{base_url}{number}/{index}.jpg" type="image/jpeg" '
+                                 f'length="1"/>' for index in range(1, links))
+            items.append(f"<entry><title>News {number}</title>"
+                         f'<link rel="alternate" type="text/html" href="{base_url}{number}.html"/>'
+                         f"<id>{base_url}{number}.html</id>"
+                         f"<published>{(published - timedelta(minutes=number)).isoformat()}</published>"
+                         f"<updated>{(published - timedelta(minutes=number)).isoformat()}</updated>"
+                         f"<summary>{summary}</summary>{enclosures}</entry>")
+        else:
+            enclosures = "".join(f'<enclosure url="{base_url}{number}/{index}.jpg" type="image/jpeg" length="1"/>'
+                                 for index in range(1, links))
+            items.append(f"<item><title>News {number}</title>"
+                         f"<link>{base_url}{number}.html</link>"
+                         f"<guid>{base_url}{number}.html</guid>"
+                         f"<pubDate>{format_datetime(published - timedelta(minutes=number))}</pubDate>"
+                         f"<description>{summary}</description>{enclosures}</item>")
+    if feed_format == "atom":
+        document = (f'<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+                    f'<title>{title}</title><link href="{base_url}"/><id>{base_url}</id>'
+                    f'<updated>{published.isoformat()}</updated>{"".join(items)}</feed>')
+    else:
+        document = (f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel><title>{title}</title>'
+                    f'<link>{base_url}</link><description>{title}</description>{"".join(items)}</channel></rss>')
+    return document.encode("utf-8")
+
+
+def generate_entries(entries=1000, links=2, summary_length=200, rss_source="http://bench.local/rss",
+                     step=timedelta(minutes=1)):
+    """
+    Lazily generate synthetic normalized entries (as produced by RssReader.iter_entries)
+    :param int entries: number of entries
+    :param int links: number of links per entry
+    :param int summary_length: length of the summary in characters
+    :param str rss_source: RSS URL of the entries
+    :param timedelta step: time between publish dates of entries
+    :return: generator of Entry instances
+    """
+    summary = ("lorem ipsum " * (summary_length // 12 + 1))[:summary_length]
+    published = datetime(2022, 9, 27, 12, 0, tzinfo=timezone(timedelta(hours=3)))
+    for number in range(entries):
+        link = f"http://bench.local/{number}.html"
+        yield Entry(rss_source, "Synthetic Feed", f"News {number}", str(published - step * number),
+                    link, summary,
+                    [Link(1, link, "text/html")] +
+                    [Link(index + 1, f"http://bench.local/{number}/{index}.jpg", "image/jpeg")
+                     for index in range(1, links)])
+
+
+def legacy_pass_to_html(html_path, rss_json):
+    """
+    The html export as it was before HtmlWriter: the document is concatenated in memory and written at the end.
+    It is kept only as the reference for benchmark_html.
+    """
+    with open(html_path, "w", encoding="utf-8") as outfile:
+        html_template = """<html>
+          <head>
+          <title>RSS-reader</title>
+          <meta charset="utf-8">
+          </head>
+          <body>
+          """
+
+        for entry in rss_json['entries']:
+            keys_entry = entry.keys()
+            html_template += f"<h1>{entry['feed']}</h1>"
+            html_template += f"<h2>{entry['title']}</h2>"
+            html_template += f"<p>{entry['date']}</p>"
+            for link in entry['links']:
+                if link['type'] == 'image/jpeg':
+                    html_template += f"<img src='{link['href']}'/>"
+
+            if "summary" in keys_entry:
+                html_template += f"<p>{entry['summary']}</p>"
+            html_template += f"<a href='{entry['link']}'>More details ...</a>"
+
+        html_template += """
+          </body>
+          </html>
+          """
+        outfile.write(html_template)
+
+
+def legacy_pass_to_pdf(pdf_path, rss_json):
+    """
+    The pdf export as it was before PdfWriter: the font is added to every document and every field is
+    laid out by FPDF.write(). It is kept only as the reference for benchmark_pdf.
+    """
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.add_font('DejaVu', fname='data/DejaVuSerif-Bold.ttf')
+    pdf.set_font('DejaVu', size=14)
+
+    for entry in rss_json['entries']:
+        keys_entry = entry.keys()
+        pdf.write(text=f"\n\nFeed: {entry['feed']}")
+        pdf.write(text=f"\n\nTitle: {entry['title']}")
+        pdf.write(text=f"\n\nDate: {entry['date']}")
+        if "summary" in keys_entry:
+            pdf.write(text=f"\n\nSummary: {entry['summary']}")
+        pdf.write(text=f"\n\n")
+        pdf.cell(text="See more details ...", border=1, align="C", link=f"{entry['link']}")
+        pdf.write(text=f"\n\n\n--------------------------")
+    pdf.output(pdf_path)
+
+
+def measure(func, *args) -> tuple:
+    """
+    Run the function twice: for time and for peak memory (tracemalloc slows it down)
+    :return: (seconds, peak memory in bytes)
+    """
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def benchmark_html(sizes=(1000, 10000, 100000)) -> dict:
+    """
+    Compare HtmlWriter (pass_to_html) with the legacy string concatenation. Entries are generated lazily,
+    so the peak memory shows what the export itself holds.
+    :return: dictionary {size: {"legacy": (seconds, peak), "streaming": (seconds, peak)}}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        html_path = path.join(tmp_dir, "bench.html")
+        for size in sizes:
+            results[size] = {
+                "legacy": measure(lambda: legacy_pass_to_html(html_path, {"entries": generate_entries(size)})),
+                "streaming": measure(lambda: pass_to_html(html_path, {"entries": generate_entries(size)})),
+            }
+            os.remove(html_path)
+    return results
+
+
+def benchmark_pdf(sizes=(1000, 10000), split_size=2500, workers=None) -> dict:
+    """
+    Compare PdfWriter (pass_to_pdf), its split parallel mode and the legacy FPDF.write() layout
+    :return: dictionary {size: {name: seconds}}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = path.join(tmp_dir, "bench.pdf")
+        for size in sizes:
+            results[size] = {}
+            for name, export in (("legacy", lambda: legacy_pass_to_pdf(pdf_path, {"entries": generate_entries(size)})),
+                                 ("batched", lambda: pass_to_pdf(pdf_path, {"entries": generate_entries(size)})),
+                                 ("split", lambda: pass_to_pdf(pdf_path, {"entries": generate_entries(size)},
+                                                               split_size, workers))):
+                start = time.perf_counter()
+                export()
+                results[size][name] = time.perf_counter() - start
+    return results
+
+
+def benchmark_dates(entries=10000) -> dict:
+    """
+    Compare DateNormalizer with dateutil on the RFC 822 dates of a synthetic feed
+    :return: dictionary {name: entries per second}
+    """
+    import feedparser
+
+    feed_entries = feedparser.parse(generate_feed(entries)).entries
+    normalizer = DateNormalizer()
+    results = {}
+    for name, normalize in (("dateutil", parse_dateutil),
+                            ("normalizer", lambda entry: normalizer.normalize("http://bench.local/rss", entry))):
+        start = time.perf_counter()
+        for entry in feed_entries:
+            normalize(entry)
+        results[name] = entries / (time.perf_counter() - start)
+    return results
+
+
+def benchmark_entries(size=100000) -> dict:
+    """
+    Compare memory held by cached entries loaded as dictionaries and as Entry instances.
+    Both are loaded from json lines, so every string is a separate object as it is after reading the cache.
+    :return: dictionary {name: bytes per entry}
+    """
+    lines = [json.dumps(entry.to_dict()) for entry in generate_entries(size)]
+    results = {}
+    for name, load in (("dict", json.loads), ("Entry", lambda line: Entry.from_dict(json.loads(line)))):
+        tracemalloc.start()
+        entries = [load(line) for line in lines]
+        results[name] = tracemalloc.get_traced_memory()[0] / size
+        tracemalloc.stop()
+        del entries
+    return results
+
+
+def benchmark_query(size=100000, sources=10, queries=5) -> dict:
+    """
+    Compare the latency of a date query: parsing the whole JSON Lines cache, reading the entries found
+    with the offset index and reading the Parquet snapshot.
+    The entries of every source are published one per hour, so a day has at most 24 entries per source.
+    :return: dictionary {name: seconds per query}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = JsonLinesCache(path.join(tmp_dir, "news.json"))
+        with cache.open_writer() as writer:
+            for number in range(sources):
+                for entry in generate_entries(size // sources, rss_source=f"http://bench.local/{number}",
+                                              step=timedelta(hours=1)):
+                    writer.write_entry(entry)
+        start = time.perf_counter()
+        for _ in range(queries):
+            number = len(cache.filter_records(cache.iter_records(), 20220927))
+        results["scan"] = (time.perf_counter() - start) / queries
+
+        cache.read_entries(20220927)
+        for name, rss_source in (("index", None), ("index/source", "http://bench.local/0")):
+            start = time.perf_counter()
+            for _ in range(queries):
+                assert len(cache.read_entries(20220927, rss_source)) == (number if rss_source is None
+                                                                         else number // sources)
+            results[name] = (time.perf_counter() - start) / queries
+
+        start = time.perf_counter()
+        ParquetSnapshot(cache).compact()
+        results["compaction"] = time.perf_counter() - start
+        for name, rss_source in (("parquet", None), ("parquet/source", "http://bench.local/0")):
+            start = time.perf_counter()
+            for _ in range(queries):
+                assert len(cache.read_entries(20220927, rss_source)) == (number if rss_source is None
+                                                                         else number // sources)
+            results[name] = (time.perf_counter() - start) / queries
+    return results
+
+
+def benchmark_search(size=1000000, sources=10, queries=20) -> dict:
+    """
+    Measure the search index over a JSON Lines cache: building it from scratch, an incremental update
+    after one fetch, and the latency of keyword and date range queries compared with a full scan.
+    The entries of every source are published one per hour.
+    :return: dictionary {name: seconds (per query for queries)}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = JsonLinesCache(path.join(tmp_dir, "news.json"))
+        with cache.open_writer() as writer:
+            for number in range(sources):
+                for entry in generate_entries(size // sources, rss_source=f"http://bench.local/{number}",
+                                              step=timedelta(hours=1)):
+                    writer.write_entry(entry)
+
+        start = time.perf_counter()
+        assert len([entry for entry in cache.iter_entries() if entry["title"] == "News 4242"]) == sources
+        results["scan"] = time.perf_counter() - start
+
+        index = SearchIndex(cache)
+        start = time.perf_counter()
+        index.update()
+        results["build"] = time.perf_counter() - start
+        cache.append({"entries": [dict(entry.to_dict(), link=f"http://bench.local/new/{number}.html")
+                                  for number, entry in enumerate(generate_entries(20))]})
+        start = time.perf_counter()
+        assert index.update() == 20
+        results["update"] = time.perf_counter() - start
+
+        searches = {"keywords": ("news 4242", None, None, None),
+                    "common word": ("lorem", None, None, 20),
+                    "range": (None, 20220901, 20220907, None),
+                    "keywords+range": ("ipsum", 20220901, 20220907, 20)}
+        for name, (query, date_from, date_to, limit) in searches.items():
+            start = time.perf_counter()
+            for _ in range(queries):
+                assert index.search(query, date_from, date_to, limit=limit)
+            results[name] = (time.perf_counter() - start) / queries
+    return results
+
+
+def load_test(url, requests=2000, clients=8) -> float:
+    """
+    Send GET requests to the URL from several threads, each with its own keep-alive connection,
+    after one request which isn't timed (it builds the search index on the first search)
+    :param str url: address of the endpoint
+    :param int requests: total number of requests
+    :param int clients: number of threads
+    :return: requests per second
+    """
+    def client(number):
+        http_client = HttpClient(pool_size=1)
+        for _ in range(number, requests, clients):
+            response = http_client.get(url)
+            assert response.status == 200, response.body
+        http_client.close()
+
+    warm_up = HttpClient(pool_size=1)
+    assert warm_up.get(url).status == 200
+    warm_up.close()
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return requests / (time.perf_counter() - start)
+
+
+def benchmark_serve(url=None, requests=2000, clients=8) -> dict:
+    """
+    Load-test the /news endpoint of the API server with a date query and a keyword search of 20 news.
+    Without `url` a server is started in this process over a generated cache of 30 days of 10 sources,
+    and both queries are also measured with the LRU cache turned off.
+    :return: dictionary {name: requests per second}
+    """
+    queries = {"date": "?date=20220927", "search": "?q=news&from=20220920&limit=100"}
+    with contextlib.ExitStack() as stack:
+        server = None
+        if url is None:
+            tmp_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            cache_path = path.join(tmp_dir, "news.json")
+            generate_cache(cache_path)
+            server = stack.enter_context(RssServer(port=0, cache_path=cache_path))
+            url = server.url("/news")
+        results = {f"{name} (lru)": load_test(f"{url}{query}", requests, clients) for name, query in queries.items()}
+        if server is not None:
+            server.results.max_size = 0
+            server.results.clear()
+            results.update({f"{name} (no lru)": load_test(f"{url}{query}", requests, clients)
+                            for name, query in queries.items()})
+    return results
+
+
+def benchmark_export(days=30, entries_per_day=100, sources=10, workers=(1, 4)) -> dict:
+    """
+    Compare exporting a generated cache to one html file per (source, day): a date query and pass_to_html
+    for every file (as separate runs of the reader do, without their startup) against one pass of
+    BulkExporter with pools of processes. The search index is built before timing.
+    :return: dictionary {name: seconds}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = JsonLinesCache(path.join(tmp_dir, "news.json"))
+        generate_cache(cache.cache_path, days, entries_per_day, sources)
+        rss_sources = [f"http://bench.local/{number}" for number in range(sources)]
+        first_day = datetime(2022, 9, 27) - timedelta(days=days - 1)
+        day_keys = [int((first_day + timedelta(days=number)).strftime("%Y%m%d")) for number in range(days)]
+
+        start = time.perf_counter()
+        for rss_source in rss_sources:
+            os.makedirs(path.join(tmp_dir, "single", source_dir_name(rss_source)), exist_ok=True)
+            for day in day_keys:
+                entries = cache.read_entries(day, rss_source)
+                pass_to_html(path.join(tmp_dir, "single", source_dir_name(rss_source), f"{day}.html"),
+                             {"entries": entries})
+        results["per file"] = time.perf_counter() - start
+
+        SearchIndex(cache).update()
+        for worker_count in workers:
+            exporter = BulkExporter(cache, path.join(tmp_dir, f"bulk-{worker_count}"), workers=worker_count)
+            results[f"bulk workers={worker_count}"] = exporter.export()["seconds"]
+    return results
+
+
+def benchmark_parse(entries=10000, workers=(1, 2, 4, 8)) -> dict:
+    """
+    Measure parsing and normalization of one large feed (parse_feed and RssReader.parse_rss) in this process
+    and in process pools. The pools are started before timing, as they are shared by all feeds of a run.
+    :return: dictionary {workers: entries per second}
+    """
+    document = generate_feed(entries)
+    results = {}
+    for worker_count in workers:
+        if worker_count > 1:
+            parse_pool(worker_count).submit(int).result()
+        start = time.perf_counter()
+        news_feed = parse_feed(document, workers=worker_count)
+        rss = RssReader("http://bench.local/rss", None, False, False, None, "json", news_feed)
+        assert len(rss.parse_rss()["entries"]) == entries
+        results[worker_count] = entries / (time.perf_counter() - start)
+    return results
+
+
+def benchmark_memo(entries=1000, fetches=10) -> dict:
+    """
+    Measure fetching and normalizing an unchanged feed from the local HTTP stand-in, which ignores
+    conditional requests: parsing every body against hashing it and reading the memo of parsed feeds.
+    The memo is filled before timing.
+    :return: dictionary {name: seconds per fetch}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir, FixtureServer(generate_feed(entries)) as server:
+        memo = FeedMemo(path.join(tmp_dir, "news.json"))
+        for name, feed_memo in (("parse", None), ("memo", memo)):
+            rss = RssReader(server.url(), None, False, False, news_feed=fetch_feed(server.url(), memo=memo))
+            rss.memoize(memo)
+            rss.parse_rss()
+            start = time.perf_counter()
+            for _ in range(fetches):
+                rss = RssReader(server.url(), None, False, False, news_feed=fetch_feed(server.url(), memo=feed_memo))
+                assert len(rss.parse_rss()["entries"]) == entries
+            results[name] = (time.perf_counter() - start) / fetches
+    return results
+
+
+def generate_cache(cache_path, days=30, entries_per_day=100, sources=10, links=2, summary_length=200) -> int:
+    """
+    Fill a JSON Lines cache with a synthetic history: every source publishes entries_per_day entries a day
+    during `days` days up to 2022-09-27
+    :return: number of cached entries
+    """
+    cache = JsonLinesCache(cache_path)
+    step = timedelta(days=1) / entries_per_day
+    with cache.open_writer() as writer:
+        for number in range(sources):
+            for entry in generate_entries(days * entries_per_day, links, summary_length,
+                                          f"http://bench.local/{number}", step):
+                writer.write_entry(entry)
+    return days * entries_per_day * sources
+
+
+def best_time(func, repeat=3, setup=None) -> float:
+    """
+    Return the best time of several runs of the function, `setup` is called before every run and isn't timed
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark_suite(entries=1000, links=2, summary_length=200, feed_format="rss", days=30, entries_per_day=100,
+                    sources=10, repeat=3) -> dict:
+    """
+    Time the hot paths of RssReader separately on a synthetic feed and a synthetic cache history:
+    parse_rss (the feed is already parsed by feedparser), write_json to an empty cache, read_cashed_news
+    of one day, print_rss in human readable format, pass_to_html and pass_to_pdf
+    :return: dictionary {"params": parameters of the run, "results": {name: best seconds}}
+    """
+    import feedparser
+
+    params = {"entries": entries, "links": links, "summary_length": summary_length, "format": feed_format,
+              "days": days, "entries_per_day": entries_per_day, "sources": sources, "repeat": repeat}
+    results = {}
+    news_feed = feedparser.parse(generate_feed(entries, links, summary_length, feed_format=feed_format))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rss = RssReader("http://bench.local/rss", None, False, False, None, "json", news_feed)
+        results["parse_rss"] = best_time(rss.parse_rss, repeat)
+        rss_json = rss.parse_rss()
+        assert len(rss_json["entries"]) == entries
+
+        runs = iter(range(repeat))
+        results["write_json"] = best_time(lambda: rss.write_json(rss_json), repeat,
+                                          lambda: setattr(rss, "cache_path",
+                                                          path.join(tmp_dir, f"write{next(runs)}.json")))
+
+        generate_cache(path.join(tmp_dir, "history.json"), days, entries_per_day, sources, links, summary_length)
+        cached = RssReader(None, None, False, False, 20220927, "json")
+        cached.cache_path = path.join(tmp_dir, "history.json")
+        assert cached.read_cashed_news()
+        results["read_cashed_news"] = best_time(cached.read_cashed_news, repeat)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            results["print_rss"] = best_time(lambda: rss.print_rss(rss_json), repeat)
+        results["pass_to_html"] = best_time(lambda: pass_to_html(path.join(tmp_dir, "bench.html"), rss_json), repeat)
+        results["pass_to_pdf"] = best_time(lambda: pass_to_pdf(path.join(tmp_dir, "bench.pdf"), rss_json), repeat)
+    return {"params": params, "results": results}
+
+
+def compare_with_baseline(report, baseline, threshold=0.25) -> list:
+    """
+    Find hot paths which became slower than in the baseline by more than `threshold` (0.25 means 25%)
+    :param report: result of benchmark_suite
+    :param baseline: result of benchmark_suite stored earlier
+    :param threshold: allowed slowdown
+    :return: list of (name, baseline seconds, seconds) of regressions
+    """
+    regressions = []
+    for name, elapsed in report["results"].items():
+        expected = baseline.get("results", {}).get(name)
+        if expected is not None and elapsed > expected * (1 + threshold):
+            regressions.append((name, expected, elapsed))
+    return regressions
+
+
+class FixtureServer:
+    """
+        A class to represent a local HTTP stand-in serving fixture feeds.
+
+        Every path is answered with the same document after `latency` seconds, which imitates
+        a remote server. Connections are kept alive (HTTP/1.1) and counted. If `etag` is given, it is sent
+        with the document and a request with the same If-None-Match is answered with '304 Not Modified'.
+        If `compress` is set, the document is sent gzipped to clients which accept gzip. Use it as a context
+        manager; `url(name)` returns the address of a feed.
+        """
+
+    def __init__(self, document, latency=0.0, etag=None, compress=False):
+        self.document = document
+        self.latency = latency
+        self.etag = etag
+        self.compress = compress
+        self.requests = 0
+        self.connections = 0
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                fixture.connections += 1
+                super().setup()
+
+            def do_GET(self):
+                fixture.requests += 1
+                time.sleep(fixture.latency)
+                if fixture.etag is not None and self.headers.get("If-None-Match") == fixture.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = fixture.document
+                self.send_response(200)
+                self.send_header("Content-Type", "application/rss+xml; charset=utf-8")
+                if fixture.etag is not None:
+                    self.send_header("ETag", fixture.etag)
+                if fixture.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, name="feed"):
+        return f"http://127.0.0.1:{self.server.server_port}/{name}.xml"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def benchmark_fetch(feeds=100, workers=(1, 4, 16, 64), entries=20, latency=0.05) -> dict:
+    """
+    Measure throughput of rss_fetcher.fetch_feeds against the local HTTP stand-in
+    :return: dictionary {workers: feeds per second}
+    """
+    results = {}
+    with FixtureServer(generate_feed(entries), latency) as server:
+        sources = [server.url(f"feed{number}") for number in range(feeds)]
+        for worker_count in workers:
+            start = time.perf_counter()
+            fetched = fetch_feeds(sources, worker_count)
+            elapsed = time.perf_counter() - start
+            assert all(len(news_feed.entries) == entries for _, news_feed in fetched)
+            results[worker_count] = feeds / elapsed
+    return results
+
+
+def main():
+    """
+    Run benchmarks and print results
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks of the RSS reader.")
+    parser.add_argument("benchmarks", help="Benchmarks to run: fetch, html, pdf, dates, entries, query, parse, "
+                                           "search, serve, export, memo, suite "
+                                           "(all by default, query needs pyarrow)", nargs="*")
+    parser.add_argument("--feeds", help="Number of feeds to fetch", type=int, default=100)
+    parser.add_argument("--entries", help="Number of entries in a feed (20 for fetch and 1000 for suite by default)",
+                        type=int)
+    parser.add_argument("--latency", help="Latency of the local server in seconds", type=float, default=0.05)
+    parser.add_argument("--links", help="Number of links per entry of the suite", type=int, default=2)
+    parser.add_argument("--summary-length", help="Length of summaries of the suite", type=int, default=200)
+    parser.add_argument("--format", help="Format of the suite feed", choices=["rss", "atom"], default="rss")
+    parser.add_argument("--days", help="Days of the suite cache history", type=int, default=30)
+    parser.add_argument("--repeat", help="Runs of every suite benchmark, the best one is taken", type=int, default=3)
+    parser.add_argument("--url", help="Address of /news of a running API server to load-test")
+    parser.add_argument("--requests", help="Number of requests of every serve load test", type=int, default=2000)
+    parser.add_argument("--clients", help="Number of concurrent clients of the serve load test", type=int,
+                        default=8)
+    parser.add_argument("--output", help="Write suite results as JSON to the file")
+    parser.add_argument("--baseline", help="Compare suite results with the JSON file written by --output")
+    parser.add_argument("--threshold", help="Allowed slowdown against the baseline, 0.25 means 25%%",
+                        type=float, default=0.25)
+    args = parser.parse_args()
+    benchmarks = args.benchmarks or ["fetch", "html", "pdf", "dates", "entries", "query", "parse", "search",
+                                     "serve", "export", "memo", "suite"]
+
+    if "fetch" in benchmarks:
+        entries = args.entries or 20
+        print(f"fetch: {args.feeds} feeds x {entries} entries, server latency {args.latency}s")
+        for worker_count, throughput in benchmark_fetch(args.feeds, entries=entries,
+                                                        latency=args.latency).items():
+            print(f"  workers={worker_count:<3} {throughput:8.1f} feeds/s")
+
+    if "html" in benchmarks:
+        print("html: legacy concatenation vs streaming HtmlWriter")
+        for size, result in benchmark_html().items():
+            for name, (elapsed, peak) in result.items():
+                print(f"  {size:>7} entries {name:<10} {elapsed:8.3f} s {peak / 2 ** 20:9.1f} MiB peak")
+
+    if "pdf" in benchmarks:
+        print(f"pdf: legacy FPDF.write() vs batched PdfWriter vs split into parts in {os.cpu_count()} processes")
+        for size, result in benchmark_pdf().items():
+            for name, elapsed in result.items():
+                print(f"  {size:>7} entries {name:<10} {elapsed:8.3f} s")
+
+    if "dates" in benchmarks:
+        print("dates: dateutil vs DateNormalizer with the memoized format")
+        for name, throughput in benchmark_dates().items():
+            print(f"  {name:<10} {throughput:10.0f} entries/s")
+
+    if "entries" in benchmarks:
+        print("entries: memory of 100000 cached entries as dictionaries vs slotted Entry")
+        for name, per_entry in benchmark_entries().items():
+            print(f"  {name:<10} {per_entry:8.0f} bytes per entry")
+
+    if "query" in benchmarks:
+        print("query: --date on 100000 cached entries of 10 sources: full scan vs offset index vs Parquet snapshot")
+        for name, elapsed in benchmark_query().items():
+            print(f"  {name:<15} {elapsed:8.3f} s")
+
+    if "parse" in benchmarks:
+        print(f"parse: one feed of 10000 entries in this process vs a pool of processes ({os.cpu_count()} CPUs)")
+        for worker_count, throughput in benchmark_parse().items():
+            print(f"  workers={worker_count:<3} {throughput:10.0f} entries/s")
+
+    if "search" in benchmarks:
+        print("search: --search and --from/--to on 1000000 cached entries of 10 sources: full scan vs search index")
+        for name, elapsed in benchmark_search().items():
+            print(f"  {name:<15} {elapsed:8.4f} s")
+
+    if "serve" in benchmarks:
+        print(f"serve: {args.requests} requests to /news of {args.url or 'a local API server'} "
+              f"from {args.clients} clients")
+        for name, throughput in benchmark_serve(args.url, args.requests, args.clients).items():
+            print(f"  {name:<15} {throughput:8.0f} requests/s")
+
+    if "export" in benchmarks:
+        print(f"export: 30 days of 10 sources to 300 html files: one run per file vs one pass "
+              f"({os.cpu_count()} CPUs)")
+        for name, elapsed in benchmark_export().items():
+            print(f"  {name:<17} {elapsed:8.3f} s")
+
+    if "memo" in benchmarks:
+        entries = args.entries or 1000
+        print(f"memo: an unchanged feed of {entries} entries fetched again: parsing vs the memo of parsed feeds")
+        for name, elapsed in benchmark_memo(entries).items():
+            print(f"  {name:<10} {elapsed:8.4f} s per fetch")
+
+    if "suite" in benchmarks:
+        report = benchmark_suite(args.entries or 1000, args.links, args.summary_length, args.format, args.days,
+                                 repeat=args.repeat)
+        print(f"suite: {report['params']['entries']} {args.format} entries, "
+              f"{args.days} days of cache history, best of {args.repeat} runs")
+        for name, elapsed in report["results"].items():
+            print(f"  {name:<17} {elapsed:8.4f} s")
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as outfile:
+                json.dump(report, outfile, indent=2)
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as infile:
+                baseline = json.load(infile)
+            if baseline.get("params") != report["params"]:
+                print("  warning: the baseline was recorded with other parameters")
+            regressions = compare_with_baseline(report, baseline, args.threshold)
+            for name, expected, elapsed in regressions:
+                print(f"  regression: {name} {elapsed:.4f} s against {expected:.4f} s in the baseline")
+            if regressions:
+                sys.exit(1)
+            print(f"  no regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1388 @@
+import importlib.util
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+from contextlib import closing
+from hashlib import blake2b
+from os import path
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+sys.path.append(path.dirname(SCRIPT_DIR))
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from reader.rss_exeptions import RssReaderCacheException
+from reader.rss_dates import date_key
+from reader.rss_model import Entry, as_dict, entry_to_json
+from reader.rss_stats import stats
+
+__SEGMENT_PREFIX__ = "news-"
+__SEGMENT_SUFFIX__ = ".jsonl"
+__SEGMENT_SIZE__ = 64 * 1024 * 1024
+__SEEN_SUFFIX__ = ".seen"
+__LOCK_SUFFIX__ = ".lock"
+__READ_LOCK_SUFFIX__ = ".readlock"
+__INDEX_SUFFIX__ = ".idx"
+__SQLITE_TIMEOUT__ = 60
+__RECORD_PREFIX__ = b'{"entries": ['
+__REWRITE_RECORD_SIZE__ = 1000
+__SNAPSHOT_SUFFIX__ = ".parquet"
+__SNAPSHOT_MANIFEST__ = "manifest.json"
+__SNAPSHOT_COLUMNS__ = ("rss_source", "feed", "title", "date", "link", "id", "summary", "links")
+__LRU_SIZE__ = 256
+
+
+def entry_key(rss_source, entry):
+    """
+    Return the key of an entry in SeenSet: a 64-bit hash of the RSS URL and the entry link (or id)
+    :param str rss_source: RSS URL
+    :param entry: normalized entry or entry of feedparser
+    :return: int or None if the entry has neither link nor id
+    """
+    identifier = entry.get("link") or entry.get("id")
+    if not identifier:
+        return None
+    digest = blake2b(f"{rss_source or ''}\0{identifier}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def unique_key(entry) -> str:
+    """
+    Return the key which deduplicates copies of an entry cached by several fetches. The stored 'day'
+    is left out, so copies cached before and after the field was introduced are equal.
+    :param dict entry: cached entry
+    :return: str
+    """
+    return json.dumps({key: value for key, value in entry.items() if key != "day"}, sort_keys=True)
+
+
+def source_id(rss_source) -> str:
+    """
+    Return a short hash of the RSS URL which can be used in file names
+    :param str rss_source: RSS URL
+    :return: 16 hex digits
+    """
+    return blake2b(str(rss_source).encode("utf-8"), digest_size=8).hexdigest()
+
+
+class FileLock:
+    """
+        A class to represent an advisory lock of a file shared by processes.
+
+        fcntl.flock() is used on POSIX and msvcrt.locking() on Windows. The lock is exclusive unless
+        `shared` is set; msvcrt has no shared locks, so there a shared lock is exclusive too.
+        The lock is not reentrant. Use it as a context manager.
+        """
+
+    def __init__(self, lock_path, shared=False):
+        """
+        The initialization method for the FileLock instance.
+        :param str lock_path: path to the lock file, it is created if it does not exist
+        :param bool shared: take a shared lock instead of an exclusive one
+        """
+        self.lock_path = lock_path
+        self.shared = shared
+        self.lockfile = None
+
+    def __enter__(self):
+        directory = path.dirname(self.lock_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lockfile = open(self.lock_path, "a+b")
+        if fcntl is not None:
+            fcntl.flock(self.lockfile.fileno(), fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        else:
+            self.lockfile.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self.lockfile.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.lockfile.fileno(), fcntl.LOCK_UN)
+            else:
+                self.lockfile.seek(0)
+                msvcrt.locking(self.lockfile.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.lockfile.close()
+            self.lockfile = None
+
+
+class SeenSet:
+    """
+        A class to represent the persisted set of already cached entries.
+
+        An entry is known by the 64-bit hash of its RSS URL and link (see entry_key), so the set takes
+        8 bytes per entry on disk. The hashes are stored next to the cache and appended when the set
+        is saved. If the file does not exist yet, the set is filled from the existing cache once.
+
+        Attributes
+        ----------
+        seen_path : str
+             Path to the file with hashes
+        hashes : set
+             Hashes of cached entries
+        size : int
+             Bytes of the file which are already read
+
+        Methods
+        -------
+        add(self, key):
+            Add a key and tell whether it is new
+        refresh(self):
+            Read the hashes which other processes appended to the file
+        save(self):
+            Append the new hashes to the file
+        """
+
+    def __init__(self, seen_path, cached_entries=()):
+        """
+        The initialization method for the SeenSet instance.
+        :param str seen_path: path to the file with hashes
+        :param cached_entries: entries of the existing cache, read only if the file does not exist
+        """
+        self.seen_path = seen_path
+        self.hashes = set()
+        self.new_hashes = array("Q")
+        self.size = 0
+        if path.isfile(seen_path):
+            self.refresh()
+        else:
+            for entry in cached_entries:
+                self.add(entry_key(entry.get("rss_source"), entry))
+
+    def __contains__(self, key) -> bool:
+        return key is not None and key in self.hashes
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add(self, key) -> bool:
+        """
+        Add a key and tell whether it is new. An entry without a key is always new.
+        :param key: key of the entry (see entry_key)
+        :return: True if the key was not seen before
+        """
+        if key is None:
+            return True
+        if key in self.hashes:
+            return False
+        self.hashes.add(key)
+        self.new_hashes.append(key)
+        return True
+
+    def refresh(self) -> set:
+        """
+        Read the hashes which other processes appended to the file since it was read. Call it under the lock
+        of the cache before the new hashes are saved, so the same entry is not cached by two processes.
+        :return: new hashes of this set which are already saved by other processes
+        """
+        if not path.isfile(self.seen_path):
+            return set()
+        with open(self.seen_path, "rb") as infile:
+            if os.fstat(infile.fileno()).st_size < self.size:
+                self.size = 0
+            infile.seek(self.size)
+            data = infile.read()
+        stored = array("Q")
+        stored.frombytes(data[:len(data) - len(data) % stored.itemsize])
+        self.size += len(stored) * stored.itemsize
+        self.hashes.update(stored)
+        duplicates = set(stored).intersection(self.new_hashes)
+        if duplicates:
+            self.new_hashes = array("Q", [key for key in self.new_hashes if key not in duplicates])
+        return duplicates
+
+    def save(self):
+        """
+        Append the new hashes to the file
+        """
+        if not self.new_hashes:
+            return
+        directory = path.dirname(self.seen_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.seen_path, "ab") as outfile:
+            self.new_hashes.tofile(outfile)
+        self.new_hashes = array("Q")
+
+
+class JsonLinesCache:
+    """
+        A class to represent an append-only cache of rss-news.
+
+        Every fetch is stored as one line (one `rss_json`) in a JSON Lines segment, so a write costs
+        only the size of that fetch. The writer stores the publish date of every entry as an integer
+        YYYYMMDD in the 'day' field, which is used by the date query and stripped on read. Segments live
+        in a directory next to the legacy cache file (`data/news.json` -> `data/news/`) and are rotated
+        when they grow over `segment_size` bytes.
+        Several processes can write to the cache at the same time: a record is appended to the segment
+        as a whole under the lock of the cache (see lock()). Readers of the segments share another lock
+        (see read_lock()), which rewrite() takes exclusively to swap the store.
+
+        Attributes
+        ----------
+        cache_path : str
+             Path to the legacy json cache file
+        store_dir : str
+             Directory with JSON Lines segments
+        segment_size: int
+             Size of a segment in bytes after which a new segment is started
+
+        Methods
+        -------
+        exists(self):
+            Check whether there is any cached data
+        size(self):
+            Return the size of the cached data in bytes
+        version(self):
+            Return a value which changes whenever the cached data changes
+        lock(self):
+            Return the lock which serializes writers of the cache
+        read_lock(self, shared):
+            Return the lock which readers of the segments share
+        migrate(self):
+            One-time migration of the legacy {"data": [...]} cache file to segments
+        append(self, rss_json):
+            Append one fetch to the active segment
+        open_writer(self, seen):
+            Open a writer which appends one fetch entry by entry
+        seen(self):
+            Load the set of cached entries
+        iter_records(self):
+            Iterate over all cached fetches in the order they were written
+        iter_entries(self):
+            Iterate over all cached entries in the order they were written
+        entries_since(self, position):
+            Return entries written after the position and the new position
+        read_entries(self, date, rss_source, limit):
+            Return cached entries filtered by date and source
+        rebuild_index(self):
+            Build the offset index of all segments again
+        rewrite(self, select):
+            Rewrite the store with unique entries chosen by the function
+        """
+
+    def __init__(self, cache_path, segment_size=__SEGMENT_SIZE__):
+        """
+        The initialization method for the JsonLinesCache instance.
+        :param str cache_path: path to the legacy json cache file
+        :param int segment_size: size of a segment in bytes
+        """
+        self.cache_path = cache_path
+        self.store_dir = path.splitext(cache_path)[0]
+        self.segment_size = segment_size
+
+    def exists(self) -> bool:
+        """
+        Check whether there is any cached data
+        :return: True if segments or the legacy cache file exist
+        """
+        return path.isdir(self.store_dir) or path.isfile(self.cache_path)
+
+    def size(self) -> int:
+        """
+        Return the size of the cached data
+        :return: size of segments (or of the legacy cache file) in bytes
+        """
+        if not path.isdir(self.store_dir):
+            return path.getsize(self.cache_path) if path.isfile(self.cache_path) else 0
+        with self.read_lock():
+            return sum(path.getsize(segment) for segment in self.segments())
+
+    def version(self):
+        """
+        Return a value which changes whenever the cached data changes: records are only appended to the last
+        segment, and a rewrite replaces all segments
+        :return: (name, size and modification time of the last segment) or None if nothing is cached
+        """
+        with self.read_lock():
+            segments = self.segments()
+            if not segments:
+                return path.getmtime(self.cache_path) if path.isfile(self.cache_path) else None
+            stat = os.stat(segments[-1])
+        return path.basename(segments[-1]), stat.st_size, stat.st_mtime_ns
+
+    def lock(self):
+        """
+        Return the lock which serializes writers of the cache. Segments, their indexes and the seen-set
+        are changed only under it.
+        :return: FileLock instance
+        """
+        return FileLock(f"{self.store_dir}{__LOCK_SUFFIX__}")
+
+    def read_lock(self, shared=True):
+        """
+        Return the lock which readers of the segments share. rewrite() takes it exclusively only to swap
+        the store, so a reader sees either the old or the new segments. Don't take the lock of writers
+        while holding it, as rewrite() takes them in the opposite order.
+        :param bool shared: False to take the lock exclusively
+        :return: FileLock instance
+        """
+        return FileLock(f"{self.store_dir}{__READ_LOCK_SUFFIX__}", shared)
+
+    def segments(self) -> list:
+        """
+        Return paths of all segments sorted in the order they were written
+        :return: list of paths
+        """
+        if not path.isdir(self.store_dir):
+            return []
+        names = sorted(name for name in os.listdir(self.store_dir)
+                       if name.startswith(__SEGMENT_PREFIX__) and name.endswith(__SEGMENT_SUFFIX__))
+        return [path.join(self.store_dir, name) for name in names]
+
+    def migrate(self):
+        """
+        One-time migration of the legacy {"data": [...]} cache file to segments.
+        The segments are built in a temporary directory which is renamed at the end, so an interrupted
+        migration is simply started again. The legacy file is kept with the '.bak' suffix.
+        """
+        if path.isdir(self.store_dir) or not path.isfile(self.cache_path):
+            return
+
+        tmp_dir = f"{self.store_dir}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name in os.listdir(tmp_dir):
+            os.remove(path.join(tmp_dir, name))
+
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as infile:
+                file_data = json.load(infile)
+        except ValueError as exc:
+            raise RssReaderCacheException(f"\nUnable to migrate the cache {self.cache_path}: {exc}")
+
+        number, size = 1, 0
+        outfile = open(self._segment_path(tmp_dir, number), "wb")
+        try:
+            for rss_json in file_data.get("data", []):
+                if size >= self.segment_size:
+                    outfile.close()
+                    number, size = number + 1, 0
+                    outfile = open(self._segment_path(tmp_dir, number), "wb")
+                size += outfile.write(self._dumps(rss_json))
+        finally:
+            outfile.close()
+
+        os.replace(tmp_dir, self.store_dir)
+        os.replace(self.cache_path, f"{self.cache_path}.bak")
+
+    def append(self, rss_json):
+        """
+        Append one fetch to the active segment
+        :param rss_json: dictionary with rss contents
+        """
+        with self.lock():
+            segment = self.active_segment()
+            with open(segment, "ab") as outfile:
+                outfile.write(self._dumps(rss_json))
+            OffsetIndex(self).update(segment)
+
+    def open_writer(self, seen=None):
+        """
+        Open a writer which appends one fetch entry by entry
+        :param SeenSet seen: if it is given, entries which are already cached are skipped
+        :return: JsonLinesWriter instance
+        """
+        return JsonLinesWriter(self, seen)
+
+    def seen(self):
+        """
+        Load the set of cached entries
+        :return: SeenSet instance
+        """
+        return SeenSet(f"{self.store_dir}{__SEEN_SUFFIX__}", self.iter_entries())
+
+    def active_segment(self) -> str:
+        """
+        Return the segment to append to, migrating the legacy cache and rotating segments if needed.
+        It has to be called under the lock of the cache.
+        If the segment ends with a partially written line (e.g. after a crash), the line is terminated,
+        so that it does not spoil the next record.
+        :return: path to the segment
+        """
+        self.migrate()
+        os.makedirs(self.store_dir, exist_ok=True)
+
+        segments = self.segments()
+        if not segments:
+            return self._segment_path(self.store_dir, 1)
+        if path.getsize(segments[-1]) >= self.segment_size:
+            return self._segment_path(self.store_dir, self._segment_number(segments[-1]) + 1)
+
+        with open(segments[-1], "rb+") as outfile:
+            if outfile.seek(0, os.SEEK_END) > 0:
+                outfile.seek(-1, os.SEEK_END)
+                if outfile.read(1) != b"\n":
+                    outfile.write(b"\n")
+        return segments[-1]
+
+    def end_position(self):
+        """
+        Return the position after the last written record
+        :return: (name of the last segment, its size) or None if there are no segments
+        """
+        segments = self.segments()
+        if not segments:
+            return None
+        return path.basename(segments[-1]), path.getsize(segments[-1])
+
+    def iter_records(self, start=None, stop=None):
+        """
+        Iterate over all cached fetches in the order they were written.
+        A partially written last line (e.g. after a crash) is skipped.
+        :param start: position (see end_position) to start from or None for the beginning
+        :param stop: position to stop at or None for the end
+        :return: generator of dictionaries with rss contents
+        """
+        if path.isdir(self.store_dir):
+            with self.read_lock():
+                for segment in self.segments():
+                    name = path.basename(segment)
+                    if (start is not None and name < start[0]) or (stop is not None and name > stop[0]):
+                        continue
+                    with open(segment, "rb") as infile:
+                        offset = infile.seek(start[1]) if start is not None and name == start[0] else 0
+                        for line in infile:
+                            offset += len(line)
+                            if stop is not None and name == stop[0] and offset > stop[1]:
+                                break
+                            try:
+                                yield json.loads(line)
+                            except ValueError:
+                                continue
+        elif path.isfile(self.cache_path):
+            with open(self.cache_path, "r", encoding="utf-8") as infile:
+                yield from json.load(infile).get("data", [])
+
+    def iter_entries(self):
+        """
+        Iterate over all cached entries in the order they were written
+        :return: generator of entries
+        """
+        for rss_json in self.iter_records():
+            for entry in rss_json.get("entries", []):
+                entry.pop("day", None)
+                yield entry
+
+    def entries_since(self, position=None) -> tuple:
+        """
+        Return entries written after the position, so that indexes over the cache can be updated incrementally.
+        Entries keep the 'day' field.
+        :param position: position returned by the previous call or None for the beginning
+        :return: (generator of entries, position after the last written record)
+        """
+        with self.lock():
+            self.migrate()
+            end = self.end_position()
+        if end is None:
+            return iter(()), position
+        start = None if position is None else tuple(position)
+        return (entry for rss_json in self.iter_records(start, end) for entry in rss_json.get("entries", [])), end
+
+    def read_entries(self, date, rss_source=None, limit=None) -> list:
+        """
+        Return cached entries filtered by date and source
+        :param int date: published date in %Y%m%d format
+        :param str rss_source: RSS URL or None for all sources
+        :param int limit: maximum number of entries or None for all
+        :return: list of entries
+        """
+        if not path.isdir(self.store_dir):
+            entries = self.filter_records(self.iter_records(), date, rss_source)
+            return entries if limit is None else entries[:limit]
+
+        index = OffsetIndex(self)
+        index.update_stale()
+        entries, start = [], None
+        with self.read_lock():
+            snapshot = ParquetSnapshot(self)
+            if snapshot.available():
+                entries, start = snapshot.read_entries(date, rss_source), snapshot.position()
+            if limit is None or len(entries) < limit:
+                entries += index.read_entries(date, rss_source, start)
+        return entries if limit is None else entries[:limit]
+
+    def rebuild_index(self) -> int:
+        """
+        Build the offset index of all segments again, e.g. if it is lost or spoiled
+        :return: number of index rows (entries and records of other shape)
+        """
+        with self.lock():
+            self.migrate()
+            try:
+                return OffsetIndex(self).rebuild()
+            except OSError as exc:
+                raise RssReaderCacheException(f"\nUnable to rebuild the index: {exc}")
+
+    def rewrite(self, select) -> tuple:
+        """
+        Rewrite the store with unique entries chosen by `select`. Copies of an entry cached by several
+        fetches are merged into the last one. The new segments and their index are built in a temporary
+        directory under the lock, which replaces the store under the exclusive read lock, so readers
+        never see the store half swapped. The Parquet snapshot is dropped as it refers to the old
+        segments. The SeenSet is kept (and saved if it was never saved), so evicted entries are not
+        cached again.
+        :param select: function which takes the list of unique entries and returns the ones to keep
+        :return: (number of entries before, number of entries after)
+        """
+        with self.lock():
+            self.migrate()
+            seen_path = f"{self.store_dir}{__SEEN_SUFFIX__}"
+            seen = None if path.isfile(seen_path) else SeenSet(seen_path)
+            unique_entries = {}
+            number = 0
+            for number, entry in enumerate(self.iter_entries(), 1):
+                key = entry_key(entry.get("rss_source"), entry)
+                if seen is not None:
+                    seen.add(key)
+                key = key or unique_key(entry)
+                unique_entries.pop(key, None)
+                unique_entries[key] = entry
+            if seen is not None:
+                seen.save()
+            kept_entries = select(list(unique_entries.values()))
+
+            tmp_dir = tempfile.mkdtemp(prefix=f"{path.basename(self.store_dir)}.",
+                                       dir=path.dirname(self.store_dir) or None)
+            tmp_cache = JsonLinesCache(f"{tmp_dir}.json", self.segment_size)
+            for start in range(0, len(kept_entries), __REWRITE_RECORD_SIZE__):
+                with tmp_cache.open_writer() as writer:
+                    for entry in kept_entries[start:start + __REWRITE_RECORD_SIZE__]:
+                        writer.write_entry(entry)
+            os.makedirs(tmp_dir, exist_ok=True)
+
+            old_dir = f"{tmp_dir}.old"
+            with self.read_lock(shared=False):
+                shutil.rmtree(ParquetSnapshot(self).snapshot_dir, ignore_errors=True)
+                if path.isdir(self.store_dir):
+                    os.replace(self.store_dir, old_dir)
+                os.replace(tmp_dir, self.store_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        for suffix in (__LOCK_SUFFIX__, __READ_LOCK_SUFFIX__):
+            if path.isfile(f"{tmp_dir}{suffix}"):
+                os.remove(f"{tmp_dir}{suffix}")
+        return number, len(kept_entries)
+
+    @staticmethod
+    def records_frame(records):
+        """
+        Build a data frame of unique entries of cached fetches with the 'day' column
+        :param records: iterable of dictionaries with rss contents
+        :return: pandas.DataFrame
+        """
+        import pandas as pd
+
+        unique_entries = {unique_key(entry): entry for rss_json in records for entry in rss_json.get("entries", [])}
+        exploded_df = pd.DataFrame(list(unique_entries.values()))
+        if exploded_df.empty:
+            return exploded_df
+        if "day" not in exploded_df:
+            exploded_df["day"] = None
+        missing_days = exploded_df["day"].isna()
+        if missing_days.any() and "date" in exploded_df:
+            # entries cached before the 'day' field was introduced
+            exploded_df.loc[missing_days, "day"] = exploded_df.loc[missing_days, "date"].map(date_key)
+        return exploded_df
+
+    def filter_records(self, records, date, rss_source=None) -> list:
+        """
+        Return unique entries of cached fetches filtered by date and source
+        :param records: iterable of dictionaries with rss contents
+        :param int date: published date in %Y%m%d format
+        :param str rss_source: RSS URL or None for all sources
+        :return: list of entries
+        """
+        exploded_df = self.records_frame(records)
+        if exploded_df.empty:
+            return []
+        filtered_df = exploded_df[exploded_df["day"] == date]
+        filtered_df = filtered_df.drop(columns=["day"])
+        if rss_source is not None:
+            filtered_df = filtered_df[filtered_df['rss_source'] == rss_source]
+        return [Entry.from_dict(entry) for entry in filtered_df.to_dict('records')]
+
+    @staticmethod
+    def _dumps(rss_json) -> bytes:
+        return (json.dumps(rss_json, ensure_ascii=False) + "\n").encode("utf-8")
+
+    @staticmethod
+    def _segment_path(store_dir, number) -> str:
+        return path.join(store_dir, f"{__SEGMENT_PREFIX__}{number:06d}{__SEGMENT_SUFFIX__}")
+
+    @staticmethod
+    def _segment_number(segment) -> int:
+        return int(path.basename(segment)[len(__SEGMENT_PREFIX__):-len(__SEGMENT_SUFFIX__)])
+
+
+class OffsetIndex:
+    """
+        A class to represent the sidecar index of JsonLinesCache.
+
+        Every segment has an index file next to it ('news-000001.jsonl' -> 'news-000001.idx') with one
+        line per entry: the publish day, the hash of the source (see source_id), the offset and the length
+        of the entry json in the segment. A line '#<offset>' tells up to which offset the segment is indexed.
+        A date query reads only the index, maps the segment into memory and decodes only the entries of the
+        day (and the source). The writer appends the lines of its record, anything else written to the
+        segment (or a lost index) is indexed from the last '#' offset on the next query. A record of other
+        shape is indexed as a whole ('*' instead of the day and the source) and filtered after decoding.
+
+        Methods
+        -------
+        update(self, segment):
+            Index the part of the segment written after the last indexed offset
+        update_stale(self):
+            Index the parts of all segments written after their indexed offsets
+        rebuild(self):
+            Build the index of all segments again
+        read_entries(self, date, rss_source, start):
+            Return entries filtered by date and source
+        """
+
+    def __init__(self, cache):
+        """
+        The initialization method for the OffsetIndex instance.
+        :param JsonLinesCache cache: the indexed cache
+        """
+        self.cache = cache
+
+    @staticmethod
+    def index_path(segment) -> str:
+        return f"{path.splitext(segment)[0]}{__INDEX_SUFFIX__}"
+
+    @staticmethod
+    def format_row(entry, offset, length) -> str:
+        """
+        Return the index line of an entry
+        :param entry: Entry or dictionary with entry contents, or None for a whole record
+        :param offset: offset of the entry in the segment
+        :param length: length of the entry in bytes
+        :return: str
+        """
+        if entry is None:
+            return f"*\t*\t{offset}\t{length}\n"
+        return f"{date_key(entry.get('date')) or 0}\t{source_id(entry.get('rss_source'))}\t{offset}\t{length}\n"
+
+    def load(self, segment, date=None) -> tuple:
+        """
+        Read the index of the segment
+        :param segment: path to the segment
+        :param date: read only rows of this day (and whole records) or None for all rows
+        :return: (list of rows [day, source id, offset, length], indexed offset)
+        """
+        rows, indexed = [], 0
+        prefix = None if date is None else f"{date}\t"
+        try:
+            with open(self.index_path(segment), "r", encoding="utf-8") as infile:
+                for line in infile:
+                    if line.startswith("#"):
+                        indexed = int(line[1:])
+                    elif (prefix is None or line.startswith(prefix) or line.startswith("*")) and line.endswith("\n"):
+                        rows.append(line[:-1].split("\t"))
+        except FileNotFoundError:
+            pass
+        return rows, indexed
+
+    def indexed_offset(self, segment) -> int:
+        """
+        Return up to which offset the segment is indexed. Usually it is the last line of the index,
+        otherwise the whole index is read.
+        :param segment: path to the segment
+        :return: int
+        """
+        try:
+            with open(self.index_path(segment), "rb") as infile:
+                size = infile.seek(0, os.SEEK_END)
+                infile.seek(max(size - 32, 0))
+                tail = infile.read()
+        except FileNotFoundError:
+            return 0
+        last_line = tail.rsplit(b"\n", 2)[-2] if tail.endswith(b"\n") else b""
+        if last_line.startswith(b"#"):
+            return int(last_line[1:])
+        return self.load(segment)[1]
+
+    def update(self, segment) -> int:
+        """
+        Index the part of the segment written after the last indexed offset.
+        The index is built again if the segment is shorter than the indexed offset.
+        It has to be called under the lock of the cache.
+        :param segment: path to the segment
+        :return: the indexed offset
+        """
+        indexed = self.indexed_offset(segment)
+        size = path.getsize(segment)
+        if indexed == size:
+            return indexed
+        if indexed > size:
+            os.remove(self.index_path(segment))
+            indexed = 0
+
+        lines = []
+        decoder = json.JSONDecoder()
+        with open(segment, "rb") as infile:
+            offset = infile.seek(indexed)
+            for line in infile:
+                if not line.endswith(b"\n"):
+                    break
+                lines.extend(self._index_record(decoder, line, offset))
+                offset += len(line)
+        lines.append(f"#{offset}\n")
+        with open(self.index_path(segment), "a", encoding="utf-8") as outfile:
+            outfile.writelines(lines)
+        return offset
+
+    def update_stale(self):
+        """
+        Index the parts of all segments written after their indexed offsets (e.g. by an older version or
+        before a crash). The segments are checked under the read lock and updated under the lock of writers.
+        """
+        with self.cache.read_lock():
+            stale = any(self.indexed_offset(segment) != path.getsize(segment) for segment in self.cache.segments())
+        if not stale:
+            return
+        with self.cache.lock():
+            for segment in self.cache.segments():
+                if self.indexed_offset(segment) != path.getsize(segment):
+                    self.update(segment)
+
+    def _index_record(self, decoder, line, offset) -> list:
+        try:
+            rss_json = json.loads(line)
+        except ValueError:
+            return []
+        if not line.startswith(__RECORD_PREFIX__) or list(rss_json.keys()) != ["entries"]:
+            return [self.format_row(None, offset, len(line))]
+
+        text = line.decode("utf-8")
+        position, byte_position = len(__RECORD_PREFIX__), offset + len(__RECORD_PREFIX__)
+        rows = []
+        for entry in rss_json["entries"]:
+            _, end = decoder.raw_decode(text, position)
+            length = len(text[position:end].encode("utf-8"))
+            rows.append(self.format_row(entry, byte_position, length))
+            byte_position += length + 2
+            position = end + 2
+        return rows
+
+    def rebuild(self) -> int:
+        """
+        Build the index of all segments again
+        :return: number of index rows
+        """
+        number = 0
+        for segment in self.cache.segments():
+            if path.isfile(self.index_path(segment)):
+                os.remove(self.index_path(segment))
+            self.update(segment)
+            number += len(self.load(segment)[0])
+        return number
+
+    def read_entries(self, date, rss_source=None, start=None) -> list:
+        """
+        Return unique entries filtered by date and source. Only the matching entries are decoded.
+        It has to be called under the read lock of the cache, after update_stale().
+        :param int date: published date in %Y%m%d format
+        :param str rss_source: RSS URL or None for all sources
+        :param start: position (see JsonLinesCache.end_position) to start from or None for the beginning
+        :return: list of entries
+        """
+        source = None if rss_source is None else source_id(rss_source)
+        unique_entries = {}
+        for segment in self.cache.segments():
+            name = path.basename(segment)
+            if start is not None and name < start[0]:
+                continue
+            first = start[1] if start is not None and name == start[0] else 0
+            rows = [row for row in self.load(segment, date)[0]
+                    if (row[0] == "*" or source in (None, row[1])) and int(row[2]) >= first]
+            if not rows:
+                continue
+            with open(segment, "rb") as infile, mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for row_day, _, offset, length in rows:
+                    data = mapped[int(offset):int(offset) + int(length)]
+                    if row_day != "*":
+                        entry = json.loads(data)
+                        unique_entries.setdefault(unique_key(entry), entry)
+                        continue
+                    for entry in json.loads(data).get("entries", []):
+                        if (date_key(entry.get("date")) == date
+                                and (rss_source is None or entry.get("rss_source") == rss_source)):
+                            unique_entries.setdefault(unique_key(entry), entry)
+        return [Entry.from_dict(entry) for entry in unique_entries.values()]
+
+
+class ParquetSnapshot:
+    """
+        A class to represent a columnar snapshot of JsonLinesCache for date queries.
+
+        `compact()` writes the cached entries to Parquet files partitioned by day and source
+        (`data/news.parquet/day=20220927/source_id=.../`) and remembers the position in the JSON Lines
+        segments it has reached. A date query then reads only the matching partition without parsing
+        JSON, plus the records appended after the snapshot. The segments are kept, so the snapshot
+        is only an accelerator: without pyarrow the cache is read as before.
+
+        Attributes
+        ----------
+        cache : JsonLinesCache
+             The compacted cache
+        snapshot_dir : str
+             Directory with Parquet partitions and the manifest
+
+        Methods
+        -------
+        available(self):
+            Check whether the snapshot exists and can be read
+        position(self):
+            Return the position in the segments the snapshot has reached
+        compact(self):
+            Write a new snapshot of the whole cache
+        read_entries(self, date, rss_source):
+            Return entries of the snapshot filtered by date and source
+        """
+
+    def __init__(self, cache):
+        """
+        The initialization method for the ParquetSnapshot instance.
+        :param JsonLinesCache cache: the compacted cache
+        """
+        self.cache = cache
+        self.snapshot_dir = f"{cache.store_dir}{__SNAPSHOT_SUFFIX__}"
+        self.manifest_path = path.join(self.snapshot_dir, __SNAPSHOT_MANIFEST__)
+
+    def available(self) -> bool:
+        """
+        Check whether the snapshot exists and pyarrow is installed to read it
+        :return: bool
+        """
+        return path.isfile(self.manifest_path) and importlib.util.find_spec("pyarrow") is not None
+
+    def position(self):
+        """
+        Return the position in the segments the snapshot has reached
+        :return: (name of the segment, offset) or None
+        """
+        with open(self.manifest_path, "r", encoding="utf-8") as infile:
+            position = json.load(infile)["position"]
+        return None if position is None else tuple(position)
+
+    def compact(self) -> int:
+        """
+        Write a new snapshot of the whole cache. The snapshot is built in a temporary directory which
+        replaces the previous one at the end. Entries without a publish date are not included, they
+        can't be found by date anyway.
+        :return: number of entries in the snapshot
+        """
+        if importlib.util.find_spec("pyarrow") is None:
+            raise RssReaderCacheException("\nCompacting the cache requires pyarrow: pip install pyarrow")
+        with self.cache.lock():
+            self.cache.migrate()
+            position = self.cache.end_position()
+        exploded_df = self.cache.records_frame(self.cache.iter_records(stop=position))
+        for column in __SNAPSHOT_COLUMNS__:
+            if column not in exploded_df:
+                exploded_df[column] = None
+        if not exploded_df.empty:
+            exploded_df = exploded_df[exploded_df["day"].notna()]
+        exploded_df = exploded_df[list(__SNAPSHOT_COLUMNS__) + ["day"]]
+        exploded_df["day"] = exploded_df["day"].astype("int64")
+        exploded_df["source_id"] = exploded_df["rss_source"].map(source_id)
+
+        tmp_dir = tempfile.mkdtemp(prefix=f"{path.basename(self.snapshot_dir)}.",
+                                   dir=path.dirname(self.snapshot_dir) or None)
+        if not exploded_df.empty:
+            partitions = len(exploded_df[["day", "source_id"]].drop_duplicates())
+            exploded_df.to_parquet(tmp_dir, partition_cols=["day", "source_id"], index=False,
+                                   max_partitions=max(partitions, 1024))
+        with open(path.join(tmp_dir, __SNAPSHOT_MANIFEST__), "w", encoding="utf-8") as outfile:
+            json.dump({"position": position, "entries": len(exploded_df)}, outfile)
+
+        old_dir = f"{tmp_dir}.old"
+        with self.cache.lock(), self.cache.read_lock(shared=False):
+            if path.isdir(self.snapshot_dir):
+                os.replace(self.snapshot_dir, old_dir)
+            os.replace(tmp_dir, self.snapshot_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return len(exploded_df)
+
+    def read_entries(self, date, rss_source=None) -> list:
+        """
+        Return entries of the snapshot filtered by date and source. Only the partition of the day
+        (and the source) is read, and only the columns of entries.
+        :param int date: published date in %Y%m%d format
+        :param str rss_source: RSS URL or None for all sources
+        :return: list of entries
+        """
+        import pandas as pd
+
+        partition_dir = path.join(self.snapshot_dir, f"day={date}")
+        if rss_source is not None:
+            partition_dir = path.join(partition_dir, f"source_id={source_id(rss_source)}")
+        if not path.isdir(partition_dir):
+            return []
+        snapshot_df = pd.read_parquet(partition_dir, columns=list(__SNAPSHOT_COLUMNS__))
+        return [Entry.from_dict(entry) for entry in snapshot_df.to_dict("records")]
+
+
+class SqliteCache:
+    """
+        A class to represent a SQLite cache of rss-news.
+
+        Entries are stored one per row with an index on (published, rss_source), so a query by date
+        (and source) is an index range scan which stops after `limit` rows. Entries are deduplicated
+        on (rss_source, link or id) at insert time.
+
+        Attributes
+        ----------
+        cache_path : str
+             Path to the legacy json cache file
+        db_path : str
+             Path to the SQLite database
+
+        Methods
+        -------
+        exists(self):
+            Check whether there is any cached data
+        size(self):
+            Return the size of the cached data in bytes
+        version(self):
+            Return a value which changes whenever the cached data changes
+        append(self, rss_json):
+            Insert entries of one fetch skipping the already cached ones
+        open_writer(self, seen):
+            Open a writer which inserts entries one by one
+        seen(self):
+            Load the set of cached entries
+        iter_entries(self):
+            Iterate over all cached entries in the order they were written
+        entries_since(self, position):
+            Return entries written after the position and the new position
+        read_entries(self, date, rss_source, limit):
+            Return cached entries filtered by date and source
+        rewrite(self, select):
+            Delete the entries which are not chosen by the function
+        """
+
+    def __init__(self, cache_path):
+        """
+        The initialization method for the SqliteCache instance.
+        :param str cache_path: path to the legacy json cache file
+        """
+        self.cache_path = cache_path
+        self.db_path = f"{path.splitext(cache_path)[0]}.sqlite3"
+
+    def exists(self) -> bool:
+        """
+        Check whether there is any cached data
+        :return: True if the database or a json cache to import exists
+        """
+        return path.isfile(self.db_path) or JsonLinesCache(self.cache_path).exists()
+
+    def size(self) -> int:
+        """
+        Return the size of the cached data
+        :return: size of the database in bytes
+        """
+        return path.getsize(self.db_path) if path.isfile(self.db_path) else 0
+
+    def version(self):
+        """
+        Return a value which changes whenever the cached data changes
+        :return: (size and modification time of the database) or None if it doesn't exist
+        """
+        if not path.isfile(self.db_path):
+            return None
+        stat = os.stat(self.db_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open the database, creating the schema and importing the json cache on the first use
+        :return: sqlite3.Connection
+        """
+        is_new = not path.isfile(self.db_path)
+        directory = path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        connection = sqlite3.connect(self.db_path, timeout=__SQLITE_TIMEOUT__)
+        if is_new:
+            with connection:
+                connection.executescript("""
+                    CREATE TABLE IF NOT EXISTS entries (
+                        id INTEGER PRIMARY KEY,
+                        rss_source TEXT NOT NULL,
+                        link TEXT NOT NULL,
+                        published INTEGER,
+                        entry TEXT NOT NULL,
+                        UNIQUE (rss_source, link)
+                    );
+                    CREATE INDEX IF NOT EXISTS entries_published_source ON entries (published, rss_source);
+                """)
+                self._insert(connection, JsonLinesCache(self.cache_path).iter_entries())
+        return connection
+
+    def append(self, rss_json):
+        """
+        Insert entries of one fetch skipping the already cached ones
+        :param rss_json: dictionary with rss contents
+        """
+        with closing(self.connect()) as connection, connection:
+            self._insert(connection, rss_json.get("entries", []))
+
+    def open_writer(self, seen=None):
+        """
+        Open a writer which inserts entries one by one
+        :param SeenSet seen: if it is given, entries which are already cached are skipped
+        :return: SqliteWriter instance
+        """
+        return SqliteWriter(self, seen)
+
+    def seen(self):
+        """
+        Load the set of cached entries
+        :return: SeenSet instance
+        """
+        return SeenSet(f"{self.db_path}{__SEEN_SUFFIX__}", self.iter_entries())
+
+    def iter_entries(self):
+        """
+        Iterate over all cached entries in the order they were written
+        :return: generator of entries
+        """
+        if not self.exists():
+            return
+        with closing(self.connect()) as connection:
+            for row in connection.execute("SELECT entry FROM entries ORDER BY id"):
+                yield json.loads(row[0])
+
+    def entries_since(self, position=None) -> tuple:
+        """
+        Return entries written after the position, so that indexes over the cache can be updated incrementally
+        :param int position: position returned by the previous call or None for the beginning
+        :return: (generator of entries, id of the last written row)
+        """
+        if not self.exists():
+            return iter(()), position
+        with closing(self.connect()) as connection:
+            end = connection.execute("SELECT max(id) FROM entries").fetchone()[0]
+        if end is None or end == position:
+            return iter(()), position
+        return self._iter_rows(position or 0, end), end
+
+    def _iter_rows(self, start, stop):
+        with closing(self.connect()) as connection:
+            for row in connection.execute("SELECT entry FROM entries WHERE id > ? AND id <= ? ORDER BY id",
+                                          (start, stop)):
+                yield json.loads(row[0])
+
+    def read_entries(self, date, rss_source=None, limit=None) -> list:
+        """
+        Return cached entries filtered by date and source
+        :param int date: published date in %Y%m%d format
+        :param str rss_source: RSS URL or None for all sources
+        :param int limit: maximum number of entries or None for all
+        :return: list of entries
+        """
+        query, parameters = self.build_query(date, rss_source, limit)
+        with closing(self.connect()) as connection:
+            return [Entry.from_dict(json.loads(row[0])) for row in connection.execute(query, parameters)]
+
+    def rewrite(self, select) -> tuple:
+        """
+        Delete the entries which are not chosen by `select` and rebuild the database file.
+        Entries are unique already. The SeenSet is kept (and saved if it was never saved), so evicted
+        entries are not cached again.
+        :param select: function which takes the list of entries and returns the ones to keep
+        :return: (number of entries before, number of entries after)
+        """
+        with closing(self.connect()) as connection:
+            with connection:
+                rows = connection.execute("SELECT id, entry FROM entries ORDER BY id").fetchall()
+                entries = [json.loads(entry) for _, entry in rows]
+                if not path.isfile(f"{self.db_path}{__SEEN_SUFFIX__}"):
+                    SeenSet(f"{self.db_path}{__SEEN_SUFFIX__}", entries).save()
+                kept = {id(entry) for entry in select(entries)}
+                evicted = [(row_id,) for (row_id, _), entry in zip(rows, entries) if id(entry) not in kept]
+                connection.executemany("DELETE FROM entries WHERE id = ?", evicted)
+            connection.execute("VACUUM")
+        return len(rows), len(kept)
+
+    @staticmethod
+    def build_query(date, rss_source=None, limit=None) -> tuple:
+        """
+        Build a query which is served by the (published, rss_source) index without sorting
+        :return: query and its parameters
+        """
+        if rss_source is None:
+            query = "SELECT entry FROM entries WHERE published = ? ORDER BY rss_source, id"
+            parameters = [date]
+        else:
+            query = "SELECT entry FROM entries WHERE published = ? AND rss_source = ? ORDER BY id"
+            parameters = [date, rss_source]
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        return query, parameters
+
+    @staticmethod
+    def _insert(connection, entries):
+        connection.executemany(
+            "INSERT OR IGNORE INTO entries (rss_source, link, published, entry) VALUES (?, ?, ?, ?)",
+            ((entry.get("rss_source", ""),
+              entry.get("link") or entry.get("id") or json.dumps(as_dict(entry), sort_keys=True, default=entry_to_json),
+              date_key(entry.get("date")),
+              json.dumps(entry, ensure_ascii=False, default=entry_to_json)) for entry in entries))
+
+
+class JsonLinesWriter:
+    """
+        A class to represent a record of JsonLinesCache which is written entry by entry.
+
+        The record is written to an anonymous temporary file, which is opened lazily with the first entry,
+        so an empty stream writes nothing. When the writer is closed, the record is appended to the active
+        segment as a whole under the lock of the cache, together with its lines of the offset index and
+        the new hashes of the SeenSet. So concurrent writers don't mix their records, and a record
+        interrupted by a crash never gets into the cache. Already cached entries are skipped if the SeenSet
+        is given. Entries which another process has cached since the SeenSet was read are dropped from the
+        record under the lock. Use it as a context manager.
+        """
+
+    def __init__(self, cache, seen=None):
+        self.cache = cache
+        self.seen = seen
+        self.outfile = None
+        self.offset = 0
+        self.index_rows = []
+        self.keys = []
+
+    def write_entry(self, entry):
+        """
+        Append one entry to the record
+        :param entry: Entry or dictionary with entry contents
+        """
+        key = entry_key(entry.get("rss_source"), entry)
+        if self.seen is not None and not self.seen.add(key):
+            return
+        if self.outfile is None:
+            directory = path.dirname(self.cache.store_dir)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.outfile = tempfile.TemporaryFile(dir=directory or None)
+            self.offset = self.outfile.write(__RECORD_PREFIX__)
+        else:
+            self.offset += self.outfile.write(b", ")
+        entry = dict(entry, day=date_key(entry.get("date")))
+        data = json.dumps(entry, ensure_ascii=False, default=entry_to_json).encode("utf-8")
+        self.index_rows.append(({"date": entry.get("date"), "rss_source": entry.get("rss_source")},
+                                self.offset, len(data)))
+        self.keys.append(key)
+        self.offset += self.outfile.write(data)
+
+    def drop_entries(self, keys):
+        """
+        Rewrite the record without the entries with given keys
+        :param keys: keys of entries to drop (see entry_key)
+        """
+        rows = [(row, key) for row, key in zip(self.index_rows, self.keys) if key is None or key not in keys]
+        outfile = tempfile.TemporaryFile(dir=path.dirname(self.cache.store_dir) or None)
+        self.offset = outfile.write(__RECORD_PREFIX__)
+        self.index_rows, self.keys = [], []
+        for (entry, offset, length), key in rows:
+            if self.index_rows:
+                self.offset += outfile.write(b", ")
+            self.outfile.seek(offset)
+            self.index_rows.append((entry, self.offset, length))
+            self.keys.append(key)
+            self.offset += outfile.write(self.outfile.read(length))
+        self.offset += outfile.write(b"]}\n")
+        self.outfile.close()
+        self.outfile = outfile
+
+    def close(self):
+        """
+        Terminate the record and close the segment
+        """
+        if self.outfile is None:
+            return
+        try:
+            self.offset += self.outfile.write(b"]}\n")
+            with self.cache.lock():
+                if self.seen is not None:
+                    duplicates = self.seen.refresh()
+                    if duplicates:
+                        self.drop_entries(duplicates)
+                if self.index_rows:
+                    segment = self.cache.active_segment()
+                    base = OffsetIndex(self.cache).update(segment) if path.isfile(segment) else 0
+                    self.outfile.seek(0)
+                    with open(segment, "ab") as outfile:
+                        shutil.copyfileobj(self.outfile, outfile)
+                    with open(OffsetIndex.index_path(segment), "a", encoding="utf-8") as outfile:
+                        outfile.writelines([OffsetIndex.format_row(entry, base + offset, length)
+                                            for entry, offset, length in self.index_rows]
+                                           + [f"#{base + self.offset}\n"])
+                if self.seen is not None:
+                    self.seen.save()
+            stats.increment("entries_cached", len(self.index_rows))
+            stats.set_gauge("cache_bytes", self.cache.size())
+        finally:
+            self.outfile.close()
+            self.outfile = None
+            self.index_rows = []
+            self.keys = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SqliteWriter:
+    """
+        A class to represent a transaction of SqliteCache which inserts entries one by one.
+
+        Entries are inserted in batches and committed when the writer is closed. Already cached entries
+        are skipped if the SeenSet is given. Use it as a context manager.
+        """
+
+    def __init__(self, cache, seen=None, batch_size=1000):
+        self.cache = cache
+        self.seen = seen
+        self.batch_size = batch_size
+        self.batch = []
+        self.connection = None
+
+    def write_entry(self, entry):
+        """
+        Add one entry to the transaction
+        :param entry: Entry or dictionary with entry contents
+        """
+        if self.seen is not None and not self.seen.add(entry_key(entry.get("rss_source"), entry)):
+            return
+        self.batch.append(entry)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Insert the collected entries
+        """
+        if not self.batch:
+            return
+        if self.connection is None:
+            self.connection = self.cache.connect()
+        SqliteCache._insert(self.connection, self.batch)
+        stats.increment("entries_cached", len(self.batch))
+        self.batch = []
+
+    def close(self):
+        """
+        Insert the rest of entries and commit the transaction
+        """
+        try:
+            self.flush()
+            if self.connection is not None:
+                self.connection.commit()
+            if self.seen is not None:
+                with FileLock(f"{self.cache.db_path}{__LOCK_SUFFIX__}"):
+                    self.seen.save()
+            stats.set_gauge("cache_bytes", self.cache.size())
+        finally:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LruCache:
+    """
+        A class to represent a bounded in-memory mapping which evicts the least recently used items.
+
+        Hits, misses and evictions are counted in rss_stats.stats as `<name>_hits`, `<name>_misses` and
+        `<name>_evictions`. The mapping can be shared by threads.
+
+        Attributes
+        ----------
+        max_size : int
+             Maximum number of items
+        name : str
+             Prefix of the counters
+
+        Methods
+        -------
+        get(self, key, default):
+            Return the item and mark it as recently used
+        put(self, key, value):
+            Add the item evicting the least recently used ones
+        clear(self):
+            Remove all items
+        """
+
+    def __init__(self, max_size=__LRU_SIZE__, name="lru"):
+        self.max_size = max_size
+        self.name = name
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, key, default=None):
+        with self.lock:
+            value = self.items.get(key, self)
+            if value is not self:
+                self.items.move_to_end(key)
+        stats.increment(f"{self.name}_misses" if value is self else f"{self.name}_hits")
+        return default if value is self else value
+
+    def put(self, key, value):
+        evicted = 0
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+                evicted += 1
+        if evicted:
+            stats.increment(f"{self.name}_evictions", evicted)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+def open_cache(cache_path, backend="json"):
+    """
+    Create a cache object for the chosen backend
+    :param str cache_path: path to the legacy json cache file
+    :param str backend: 'json' or 'sqlite'
+    :return: JsonLinesCache or SqliteCache instance
+    """
+    if backend == "sqlite":
+        return SqliteCache(cache_path)
+    if backend == "json":
+        return JsonLinesCache(cache_path)
+    raise RssReaderCacheException(f"\nUnknown cache backend: {backend}")
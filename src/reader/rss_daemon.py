@@ -0,0 +1,185 @@
+import heapq
+import sys
+import time
+from os import path
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+sys.path.append(path.dirname(SCRIPT_DIR))
+
+from reader.rss_cache import open_cache
+from reader.rss_entities import RssReader, __JSON_FILE__
+from reader.rss_fetcher import FeedMemo, ValidatorStore, fetch_feed
+
+__INTERVAL__ = 15 * 60
+__MAX_BACKOFF__ = 6 * 60 * 60
+__UPDATE_PERIODS__ = {"hourly": 60 * 60, "daily": 24 * 60 * 60, "weekly": 7 * 24 * 60 * 60,
+                      "monthly": 30 * 24 * 60 * 60, "yearly": 365 * 24 * 60 * 60}
+
+
+def feed_interval_hint(news_feed):
+    """
+    Return the poll interval which the feed asks for with <ttl> or <sy:updatePeriod>/<sy:updateFrequency>
+    :param news_feed: fetched feed
+    :return: interval in seconds or None if the feed has no hints
+    """
+    feed = news_feed.get("feed", {})
+    hints = []
+    try:
+        hints.append(int(feed["ttl"]) * 60)
+    except (KeyError, TypeError, ValueError):
+        pass
+    period = __UPDATE_PERIODS__.get(str(feed.get("sy_updateperiod", "")).strip().lower())
+    if period is not None:
+        try:
+            frequency = max(int(feed.get("sy_updatefrequency", 1)), 1)
+        except (TypeError, ValueError):
+            frequency = 1
+        hints.append(period // frequency)
+    return max(hints) if hints else None
+
+
+class FeedSchedule:
+    """
+        A class to represent the polling state of one feed in the daemon.
+
+        Attributes
+        ----------
+        rss_source : str
+             RSS URL
+        interval : int
+             Configured poll interval in seconds
+        next_interval: int
+             Interval before the next poll: the configured one, the feed's hint or the backoff after failures
+        failures: int
+             Number of failures in a row
+        """
+
+    def __init__(self, rss_source, interval):
+        self.rss_source = rss_source
+        self.interval = interval
+        self.next_interval = interval
+        self.failures = 0
+
+    def succeeded(self, hint=None):
+        """
+        Reset the backoff and choose the next interval honoring the feed's hint
+        :param hint: interval asked for by the feed or None
+        """
+        self.failures = 0
+        self.next_interval = max(self.interval, hint or 0)
+
+    def failed(self):
+        """
+        Double the interval for every failure in a row, up to __MAX_BACKOFF__
+        """
+        self.failures += 1
+        self.next_interval = min(self.interval * 2 ** self.failures, max(__MAX_BACKOFF__, self.interval))
+
+
+class RssDaemon:
+    """
+        A class to represent a long-running process which polls feeds and caches only new entries.
+
+        Every feed has its own schedule. Imports, the validators of conditional requests and the set
+        of already cached entries stay in memory between polls. A body which the server sends again
+        unchanged is not parsed again (see rss_fetcher.FeedMemo).
+
+        Attributes
+        ----------
+        schedules : list
+             FeedSchedule of every feed
+        reader : RssReader
+             Reader which prints and caches new entries
+
+        Methods
+        -------
+        poll(self, schedule):
+            Fetch one feed, cache and print its new entries and choose the time of the next poll
+        run(self, max_polls):
+            Poll feeds when they are due until interrupted
+        """
+
+    def __init__(self, feeds, limit=None, json=False, verbose=False, cache_backend="json",
+                 timeout=30, cache_path=__JSON_FILE__, clock=time.monotonic, sleep=time.sleep, output_format=None):
+        """
+        The initialization method for the RssDaemon instance.
+        :param feeds: list of (RSS URL, interval in seconds or None for __INTERVAL__)
+        :param int limit: Limit news topics of every poll
+        :param json: Print result as JSON in stdout
+        :param verbose: Outputs verbose status messages
+        :param cache_backend: 'json' or 'sqlite' cache backend
+        :param timeout: timeout in seconds for fetching one feed
+        :param cache_path: path to the news cache
+        :param clock: function returning the current time in seconds
+        :param sleep: function sleeping the given number of seconds
+        :param output_format: 'text', 'json' or 'ndjson' (new entries of every poll are one json document)
+        """
+        self.schedules = [FeedSchedule(rss_source, interval or __INTERVAL__) for rss_source, interval in feeds]
+        self.limit = limit
+        self.timeout = timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.reader = RssReader(None, limit, json, verbose, None, cache_backend, output_format=output_format)
+        self.reader.cache_path = cache_path
+        self.logger_obj = self.reader.logger_obj
+        self.validators = ValidatorStore(self.reader.cache_path)
+        self.memo = FeedMemo(self.reader.cache_path)
+        self.seen = open_cache(cache_path, cache_backend).seen()
+        self.queue = [(clock(), number, schedule) for number, schedule in enumerate(self.schedules)]
+        heapq.heapify(self.queue)
+
+    def poll(self, schedule) -> int:
+        """
+        Fetch one feed, cache and print its new entries and choose the time of the next poll
+        :param schedule: FeedSchedule of the feed
+        :return: number of new entries
+        """
+        etag, modified = self.validators.get(schedule.rss_source)
+        news_feed = fetch_feed(schedule.rss_source, self.timeout, etag, modified, memo=self.memo)
+        self.validators.update(schedule.rss_source, news_feed)
+
+        if news_feed.get("status", 200) >= 400 or ("bozo_exception" in news_feed and not news_feed.entries
+                                                   and news_feed.get("status") != 304):
+            schedule.failed()
+            self.logger_obj.warning(f"Polling {schedule.rss_source} failed ({schedule.failures} in a row), "
+                                    f"next poll in {schedule.next_interval} s")
+            return 0
+
+        schedule.succeeded(feed_interval_hint(news_feed))
+        rss = RssReader(schedule.rss_source, self.limit, self.reader.json, self.reader.verbose, None,
+                        self.reader.cache_backend, news_feed, self.reader.output_format)
+        number = 0
+        if not rss.not_modified:
+            rss.memoize(self.memo)
+            rss.check_limit()
+            number = self.reader.stream_rss(rss.iter_entries(self.seen), seen=self.seen)
+            if number is None or not rss.complete:
+                # the entries are not cached (or some are left out by the limit),
+                # so the feed must not be answered with '304' next time
+                self.validators.forget(schedule.rss_source)
+            number = number or 0
+        self.validators.save()
+        self.logger_obj.info(f"Polled {schedule.rss_source}: {number} new entries, "
+                             f"next poll in {schedule.next_interval} s")
+        return number
+
+    def run(self, max_polls=None):
+        """
+        Poll feeds when they are due until interrupted
+        :param max_polls: stop after this number of polls (None means forever)
+        """
+        polls = 0
+        while self.queue and (max_polls is None or polls < max_polls):
+            due, number, schedule = self.queue[0]
+            delay = due - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+                continue
+            heapq.heappop(self.queue)
+            try:
+                self.poll(schedule)
+            except Exception as exc:
+                schedule.failed()
+                self.logger_obj.error(f"Polling {schedule.rss_source} failed: {exc}")
+            heapq.heappush(self.queue, (self.clock() + schedule.next_interval, number, schedule))
+            polls += 1
@@ -0,0 +1,118 @@
+import sys
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from os import path
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+sys.path.append(path.dirname(SCRIPT_DIR))
+
+
+def parse_rfc822(entry) -> datetime:
+    """
+    Parse RFC 822 date of the entry ('Tue, 27 Sep 2022 00:40:19 +0300'), the time zone is kept
+    """
+    published = parsedate_to_datetime(entry["published"])
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=timezone.utc)
+    return published
+
+
+def parse_iso8601(entry) -> datetime:
+    """
+    Parse ISO 8601 date of the entry ('2022-09-27T00:40:19+03:00'), the time zone is kept
+    """
+    return datetime.fromisoformat(entry["published"])
+
+
+def parse_published_parsed(entry) -> datetime:
+    """
+    Use the date parsed by feedparser, which is converted to UTC
+    """
+    return datetime(*entry["published_parsed"][:6], tzinfo=timezone.utc)
+
+
+def parse_dateutil(entry) -> datetime:
+    """
+    Parse the date of any format with dateutil, it is the slowest one
+    """
+    import dateutil.parser as parser
+
+    return parser.parse(entry["published"])
+
+
+__DATE_PARSERS__ = (parse_rfc822, parse_iso8601, parse_published_parsed, parse_dateutil)
+
+
+def date_key(date_text):
+    """
+    Return the integer YYYYMMDD of a normalized date ('2022-09-27 00:40:19+00:00' -> 20220927)
+    :param date_text: normalized date
+    :return: int or None if there is no date
+    """
+    if not isinstance(date_text, str) or len(date_text) < 10:
+        return None
+    try:
+        return int(date_text[:10].replace("-", ""))
+    except ValueError:
+        return None
+
+
+def timestamp_key(date_text):
+    """
+    Return the POSIX timestamp of a normalized date, a date without a time zone is taken as UTC
+    ('2022-09-27 00:40:19+00:00' -> 1664239219.0)
+    :param date_text: normalized date
+    :return: float or None if there is no date
+    """
+    if not isinstance(date_text, str):
+        return None
+    try:
+        published = datetime.fromisoformat(date_text)
+    except ValueError:
+        return None
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=timezone.utc)
+    return published.timestamp()
+
+
+class DateNormalizer:
+    """
+        A class to represent the date normalization of entries.
+
+        Dates are parsed with the cheap parsers first: RFC 822 and ISO 8601, which keep the time zone
+        of the feed, then the date already parsed by feedparser (in UTC), and only then dateutil.
+        A feed almost always uses one format, so the parser which worked is remembered for every source
+        and tried first next time.
+
+        Attributes
+        ----------
+        source_parsers : dict
+             Index of the parser which worked last time by RSS URL
+
+        Methods
+        -------
+        normalize(self, rss_source, entry):
+            Return the publish date of the entry
+        """
+
+    def __init__(self, parsers=__DATE_PARSERS__):
+        self.parsers = parsers
+        self.source_parsers = {}
+
+    def normalize(self, rss_source, entry):
+        """
+        Return the publish date of the entry
+        :param str rss_source: RSS URL
+        :param entry: entry of feedparser
+        :return: datetime or None if the date can't be parsed
+        """
+        first = self.source_parsers.get(rss_source, 0)
+        for number in (first, *(number for number in range(len(self.parsers)) if number != first)):
+            try:
+                published = self.parsers[number](entry)
+            except (KeyError, TypeError, ValueError, OverflowError):
+                continue
+            if number != first:
+                self.source_parsers[rss_source] = number
+            return published
+        return None
@@ -1,13 +1,19 @@
-import feedparser
 import unicodedata
-import dateutil.parser as parser
-import pandas as pd
-import json
 from os import path
 import sys
+from contextlib import ExitStack
+from itertools import islice
 from datetime import date
-from reader.rss_utils import get_logger, log_decorator, exceptions_suppressing_decorator
+from reader.rss_utils import get_logger, log_decorator, exceptions_suppressing_decorator, SuppressingSink, \
+    HtmlWriter, PdfWriter, SplitPdfWriter, JsonStreamWriter, print_diagnostic
 from reader.rss_exeptions import RssReaderCacheException
+from reader.rss_cache import open_cache, entry_key
+from reader.rss_fetcher import fetch_feed
+from reader.rss_dates import DateNormalizer
+from reader.rss_model import Entry, Link
+from reader.rss_stats import stats
+from reader.rss_retention import CacheMaintenance
+from reader.rss_search import SearchIndex
 
 SCRIPT_DIR = path.dirname(path.abspath(__file__))
 sys.path.append(path.dirname(SCRIPT_DIR))
@@ -27,48 +33,81 @@ class RssReader:
              Limit news topics
         json: bool
              Print result as JSON in stdout
+        output_format: str
+             Output format: 'text', 'json' or 'ndjson'
         verbose: bool
              Outputs verbose status messages
         date: int
              Date for reading cached news
+        cache_backend: str
+             Cache backend: 'json' or 'sqlite'
+        news_feed: feedparser.FeedParserDict
+             Fetched and parsed rss
+        not_modified: bool
+             The server answered '304 Not Modified', so there is nothing to parse and the cached news are read
+        complete: bool
+             All entries of the feed were passed on by iter_entries, none were cut off by the limit
+        date_normalizer: DateNormalizer
+             Parser of publish dates shared by all readers, it remembers the date format of every source
 
         Methods
         -------
         check_limit(self):
             Checking the entered parameter '--limit' and feed size.
+        iter_entries(self, seen):
+            Lazily normalize entries of rss one by one
+        memoize(self, memo):
+            Remember the entries of a new feed body in the memo of parsed feeds once they are all normalized
         parse_rss(self):
             Parse rss and return a dictionary with its contents
+        print_entry(self, entry):
+            Print one entry to console in human readable format
         print_rss(self, rss_json):
             Print output to console in human readable format or as json
         write_json(self, rss_json):
-            Write rss-news in json file
+            Append rss-news which are not cached yet to the cache
+        stream_rss(self, entries, html_path, pdf_path, write_cache, pdf_split, seen):
+            Pass entries one by one to the cache, console, html and pdf files
         read_cashed_news(self):
-            Read json file and filter records by date and source
+            Read the cache and filter records by date and source
+        search_cashed_news(self, query, date_from, date_to, rss_source):
+            Find cached news by keywords and a range of dates
 
         """
 
-    def __init__(self, rss_source, limit=None, json=True, verbose=True, date=None):
+    date_normalizer = DateNormalizer()
+
+    def __init__(self, rss_source, limit=None, json=True, verbose=True, date=None, cache_backend="json",
+                 news_feed=None, output_format=None):
         """
         The initialization method for the RssReader instance.
         :param str rss_source: RSS URL
         :param int limit: Limit news topics
         :param json: Print result as JSON in stdout
         :param verbose: Outputs verbose status messages
+        :param cache_backend: 'json' or 'sqlite' cache backend
+        :param news_feed: already fetched feed (see rss_fetcher.fetch_feeds), the rss is downloaded if it is None
+        :param output_format: 'text', 'json' or 'ndjson', by default 'json' if `json` is set and 'text' otherwise
         """
         self.rss_source = rss_source
         self.limit = limit
-        if rss_source is not None:
-            self.news_feed = feedparser.parse(rss_source)
+        if rss_source is not None and date is None:
+            self.news_feed = fetch_feed(rss_source) if news_feed is None else news_feed
+            self.not_modified = self.news_feed.get("status") == 304
             self.number_news = len(self.news_feed.entries)
-            if limit is None:
+            if limit is None and not self.not_modified:
                 self.limit = self.number_news
             else:
                 self.limit = limit
+        self.complete = False
+        self.memo = None
         self.verbose = verbose
         self.json = json
+        self.output_format = output_format or ("json" if json else "text")
         self.logger_obj = get_logger(self.verbose)
         self.date = date
         self.cache_path = __JSON_FILE__
+        self.cache_backend = cache_backend
 
     @log_decorator()
     def check_limit(self) -> int:
@@ -93,120 +132,204 @@ class RssReader:
             self.date = today
         return self.date
 
-    @exceptions_suppressing_decorator
-    @log_decorator
-    def parse_rss(self) -> dict:
+    def iter_entries(self, seen=None):
         """
-        Parse rss and return a dictionary with its contents
-        :return: dictionary with rss contents
+        Lazily normalize entries of rss one by one, entries of a memoized feed (see memoize) are only copied.
+        The limit applies to the entries which are not skipped. A feed which is not modified has no new entries,
+        so its last cached news are read instead (if `seen` is not given).
+        `complete` is set when the iteration is over and no entry is left out by the limit.
+        :param SeenSet seen: if it is given, only entries which are not cached yet are normalized
+        :return: generator of Entry instances
         """
-        rss_json = {}
-        entries = []
+        if self.not_modified:
+            if seen is None:
+                yield from self._unchanged_entries()
+            else:
+                self.complete = True
+            return
+        if self.news_feed.get("memoized"):
+            entries = (Entry.from_dict(entry_json) for entry_json in self.news_feed.entries
+                       if seen is None or entry_key(self.rss_source, entry_json) not in seen)
+        elif self.memo is not None:
+            entries = self._memoizing_entries(seen)
+        else:
+            entries = self._normalize_entries(self.news_feed.entries, seen)
+        yield from islice(entries, self.limit)
+        self.complete = next(entries, None) is None
 
-        for entry in self.news_feed.entries[0:self.limit]:
-            keys_entry = entry.keys()
-            entry_json = {"rss_source": self.rss_source,
-                          "feed": unicodedata.normalize("NFKC", self.news_feed.feed.title)}
+    def _unchanged_entries(self):
+        cache = open_cache(self.cache_path, self.cache_backend)
+        entries = SearchIndex(cache).latest(self.rss_source, self.limit) if cache.exists() else []
+        if not entries:
+            # nothing to show, the feed has to be fetched unconditionally next time
+            print_diagnostic(f"Error: {self.rss_source} is not modified since the last fetch, "
+                             f"but its news are not cached.")
+            return
+        self.logger_obj.info(f"{self.rss_source} is not modified, {len(entries)} cached news are shown")
+        yield from entries
+        self.complete = True
 
-            if "title" in keys_entry:
-                entry_json["title"] = entry.title
+    def _memoizing_entries(self, seen=None):
+        recorded = []
+        for entry in self._normalize_entries(self.news_feed.entries):
+            recorded.append(entry.to_dict())
+            if seen is None or entry_key(self.rss_source, entry) not in seen:
+                yield entry
+        self.memo.put(self.rss_source, self.news_feed, recorded)
 
-            if "published" in keys_entry:
-                entry_json["date"] = str(parser.parse(entry.published))
+    def _normalize_entries(self, raw_entries, seen=None):
+        feed_title = unicodedata.normalize("NFKC", self.news_feed.feed.title)
 
-            if "link" in keys_entry:
-                # entry_json["link"] = unicodedata.normalize("NFKC", entry.link)
-                entry_json["link"] = entry.link
+        number = 0
+        try:
+            for entry in raw_entries:
+                if seen is not None and entry_key(self.rss_source, entry) in seen:
+                    continue
 
-            if "summary" in keys_entry:
-                # entry_json["summary"] = unicodedata.normalize("NFKC", entry.summary)
-                entry_json["summary"] = entry.summary
+                published = None
+                if "published" in entry:
+                    published = self.date_normalizer.normalize(self.rss_source, entry)
 
-            links = []
-            if "links" in keys_entry:
-                for link in entry.links:
-                    link_json = {"index": entry.links.index(link) + 1, "href": link.href, "type": link.type}
-                    links.append(link_json)
-            entry_json["links"] = links
-            entries.append(entry_json)
+                links = [Link(index, link.get("href"), link.get("type"))
+                         for index, link in enumerate(entry.get("links", ()), 1)]
+                number += 1
+                yield Entry(self.rss_source, feed_title, entry.get("title"),
+                            None if published is None else str(published), entry.get("link"), entry.get("summary"),
+                            links, None if entry.get("link") else entry.get("id"))
+        finally:
+            stats.increment("entries_parsed", number)
 
-        rss_json["entries"] = entries
+    def memoize(self, memo):
+        """
+        Remember the entries of a feed parsed from a new body in the memo by the hash of the body
+        (see rss_fetcher.FeedMemo), so the same body is not parsed again. The entries are recorded while
+        iter_entries normalizes them and are put in the memo only if the iteration reaches the end of the feed,
+        so the entries are still streamed one by one and a feed cut short by the limit is not memoized.
+        Feeds found in the memo, not modified or failed are skipped.
+        :param FeedMemo memo: memo of parsed feeds
+        """
+        if self.news_feed.get("digest") is None or self.news_feed.get("memoized") or \
+                ("bozo_exception" in self.news_feed and not self.news_feed.entries):
+            return
+        self.memo = memo
 
-        return rss_json
+    @exceptions_suppressing_decorator
+    @log_decorator
+    def parse_rss(self) -> dict:
+        """
+        Parse rss and return a dictionary with its contents
+        :return: dictionary with rss contents
+        """
+        return {"entries": list(self.iter_entries())}
+
+    def print_entry(self, entry):
+        """
+        Print one entry to console in human readable format
+        :param entry: Entry or dictionary with entry contents
+        """
+        print('\n----------------------\n')
+        links_attribute = "links"
+        main_attributes = [*filter(lambda i: i != links_attribute, entry.keys())]
+        for key in main_attributes:
+            print(f"{key.capitalize()}: {entry[key]}")
+        if links_attribute in entry.keys():
+            print("\nLinks:")
+            for index, link in enumerate(entry["links"], 1):
+                print(f"[{index}]: {link['href']} ({link['type']})")
 
     @exceptions_suppressing_decorator
     @log_decorator
     def print_rss(self, rss_json):
         """
-        Print output to console in human readable format or as json
+        Print output to console in human readable format or as a stream of json (see JsonStreamWriter)
         :param rss_json: dictionary with rss contents
         """
-        if self.json:
-            print(rss_json)
+        if self.output_format != "text":
+            with JsonStreamWriter(self.output_format) as writer:
+                for entry in rss_json["entries"]:
+                    writer.write_entry(entry)
         else:
             for entry in rss_json['entries']:
-                print('\n----------------------\n')
-                links_attribute = "links"
-                main_attributes = [*filter(lambda i: i != links_attribute, entry.keys())]
-                for key in main_attributes:
-                    print(f"{key.capitalize()}: {entry[key]}")
-                if links_attribute in entry.keys():
-                    print("\nLinks:")
-                    for link in entry["links"]:
-                        print(f"[{entry['links'].index(link) + 1}]: {link['href']} ({link['type']})")
+                self.print_entry(entry)
 
     @exceptions_suppressing_decorator
     @log_decorator
     def write_json(self, rss_json):
         """
-        Write rss-news in json file
+        Append rss-news which are not cached yet to the cache and prune the cache if its thresholds are crossed
         :param rss_json: dictionary with rss contents
         """
-        filename = self.cache_path
-        if path.isfile(filename) is False:
-            file_data = {"data": [rss_json]}
-            with open(filename, "w", encoding="utf-8") as outfile:
-                json.dump(file_data, outfile, ensure_ascii=False)
-        else:
-            with open(filename, "r+", encoding="utf-8") as outfile:
-                file_data = json.load(outfile)
-                file_data["data"].append(rss_json)
-                outfile.seek(0)
-                json.dump(file_data, outfile, ensure_ascii=False)
+        cache = open_cache(self.cache_path, self.cache_backend)
+        with cache.open_writer(cache.seen()) as writer:
+            for entry in rss_json["entries"]:
+                writer.write_entry(entry)
+        CacheMaintenance(cache).maybe_prune()
 
     @exceptions_suppressing_decorator
     @log_decorator
-    def read_cashed_news(self):
+    def stream_rss(self, entries, html_path=None, pdf_path=None, write_cache=True, pdf_split=None, seen=None) -> int:
         """
-        Read json file and filter records by date and source
+        Pass entries one by one to the cache, console (as text or json), html and pdf files as soon as they are
+        produced, so that the whole feed is never held in memory.
+        Only entries which are not cached yet are written to the cache, which is pruned afterwards
+        if its thresholds are crossed (see rss_retention.CacheMaintenance).
+        A failed html or pdf file is reported and skipped, the other outputs go on.
+        :param entries: iterable of entries, e.g. iter_entries() of one or several rss
+        :param html_path: path to html file or None
+        :param pdf_path: path to pdf file or None
+        :param write_cache: append entries to the cache
+        :param pdf_split: if it is given, write every pdf_split entries to a separate pdf file in parallel
+        :param SeenSet seen: set of cached entries, it is loaded from the cache if it is None
+        :return: number of entries
         """
-        filename = self.cache_path
-        if path.isfile(filename) is False:
-            raise RssReaderCacheException(f"\nThe cache does not exist. Please read some news first.")
-        else:
-            df = pd.read_json(filename, orient="split")
+        with ExitStack() as stack:
+            sinks = []
+            if write_cache:
+                cache = open_cache(self.cache_path, self.cache_backend)
+                sinks.append(stack.enter_context(cache.open_writer(cache.seen() if seen is None else seen)))
+            if html_path is not None:
+                sinks.append(stack.enter_context(SuppressingSink(HtmlWriter, html_path)))
+            if pdf_path is not None and pdf_split is None:
+                sinks.append(stack.enter_context(SuppressingSink(PdfWriter, pdf_path)))
+            elif pdf_path is not None:
+                sinks.append(stack.enter_context(SuppressingSink(SplitPdfWriter, pdf_path, pdf_split)))
+            if self.output_format != "text":
+                sinks.append(stack.enter_context(JsonStreamWriter(self.output_format)))
 
-            exploded_df = df.explode("entries").drop_duplicates()
-            exploded_df = pd.DataFrame(exploded_df['entries'].tolist())
-            exploded_df['formatted_date'] = exploded_df['date'].str.slice(0, 10).str.replace("-", "")
+            number = 0
+            for number, entry in enumerate(entries, 1):
+                for sink in sinks:
+                    sink.write_entry(entry)
+                if self.output_format == "text":
+                    self.print_entry(entry)
 
-            filtered_by_date_df = exploded_df[exploded_df['formatted_date'] == str(self.date)]
-            filtered_by_date_df = filtered_by_date_df.drop(columns=["formatted_date"])
+        if write_cache:
+            CacheMaintenance(cache).maybe_prune()
+        return number
 
-            if self.rss_source is None:
-                entries = filtered_by_date_df.to_dict('records')
-
-                if self.limit is None:
-                    self.limit = len(entries)
+    @exceptions_suppressing_decorator
+    @log_decorator
+    def read_cashed_news(self):
+        """
+        Read the cache and filter records by date and source
+        """
+        cache = open_cache(self.cache_path, self.cache_backend)
+        if cache.exists() is False:
+            raise RssReaderCacheException(f"\nThe cache does not exist. Please read some news first.")
+        return cache.read_entries(self.date, self.rss_source, self.limit)
 
-                if self.limit <= len(entries):
-                    return entries[:self.limit]
-                else:
-                    return entries
-            else:
-                filtered_by_source_df = filtered_by_date_df[filtered_by_date_df['rss_source'] == self.rss_source]
-                entries = filtered_by_source_df.to_dict('records')
-                if (self.limit is not None) & (self.limit <= len(entries)):
-                    return entries[:self.limit]
-                else:
-                    return entries
+    @exceptions_suppressing_decorator
+    @log_decorator
+    def search_cashed_news(self, query=None, date_from=None, date_to=None, rss_source=None):
+        """
+        Find cached news by keywords and a range of dates with the search index of the cache
+        :param str query: keywords which all have to be in the title or the summary, or None
+        :param int date_from: first published date in %Y%m%d format or None
+        :param int date_to: last published date in %Y%m%d format or None
+        :param str rss_source: RSS URL or None for all sources, the source of the reader by default
+        :return: list of entries
+        """
+        cache = open_cache(self.cache_path, self.cache_backend)
+        if cache.exists() is False:
+            raise RssReaderCacheException(f"\nThe cache does not exist. Please read some news first.")
+        return SearchIndex(cache).search(query, date_from, date_to, rss_source or self.rss_source, self.limit)
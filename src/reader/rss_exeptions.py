@@ -24,3 +24,20 @@ class RssReaderPdfException(Exception):
     A class to represent RssReaderHtmlException object.
     """
     pass
+
+
+class RssReaderHttpException(Exception):
+    """
+    A class to represent RssReaderHttpException object.
+    """
+    pass
+
+
+class RssReaderApiException(Exception):
+    """
+    A class to represent RssReaderApiException object, it is answered with its HTTP status.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
@@ -0,0 +1,163 @@
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from os import path
+from urllib.parse import urlsplit
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+sys.path.append(path.dirname(SCRIPT_DIR))
+
+from reader.rss_cache import source_id
+from reader.rss_search import SearchIndex
+from reader.rss_stats import stats
+from reader.rss_utils import HtmlWriter, PdfWriter
+
+__SLUG_LENGTH__ = 60
+
+
+def period_key(day, by="day") -> str:
+    """
+    Return the name of the period of a publish date
+    :param int day: published date in %Y%m%d format
+    :param str by: 'day' or 'week'
+    :return: '20220927' for a day or '2022-W39' for an ISO week
+    """
+    if by == "week":
+        year, week, _ = datetime.strptime(str(day), "%Y%m%d").isocalendar()
+        return f"{year}-W{week:02d}"
+    return str(day)
+
+
+def source_dir_name(rss_source) -> str:
+    """
+    Return a readable and unique directory name for the files of a source
+    :param str rss_source: RSS URL
+    :return: host and path of the URL with a short hash, e.g. 'news_yahoo_com_rss-1a2b3c4d'
+    """
+    parts = urlsplit(rss_source or "")
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", f"{parts.netloc}{parts.path}").strip("_")[:__SLUG_LENGTH__]
+    return f"{slug or 'news'}-{source_id(rss_source)[:8]}"
+
+
+def write_export_file(file_path, file_format, entries) -> tuple:
+    """
+    Write entries to one html or pdf file, it is run in the worker processes of BulkExporter
+    :param str file_path: path to the file
+    :param str file_format: 'html' or 'pdf'
+    :param list entries: entries of the file
+    :return: (file_path, number of entries, seconds)
+    """
+    start = time.perf_counter()
+    os.makedirs(path.dirname(file_path), exist_ok=True)
+    with (HtmlWriter if file_format == "html" else PdfWriter)(file_path) as writer:
+        for entry in entries:
+            writer.write_entry(entry)
+    return file_path, len(entries), time.perf_counter() - start
+
+
+class BulkExporter:
+    """
+        A class to represent the export of cached news to one file per (source, day) or per (source, week).
+
+        News are read once, ordered by date and source, from the search index of the cache (see
+        SearchIndex.iter_range), so a period is complete as soon as the next one starts. The files of
+        a finished period are sent to a pool of worker processes and written in parallel while the next
+        period is read; at most two files per worker are waiting, so memory is bounded by a period.
+        Files are named `<export_dir>/<source>/<period>.<format>` (see source_dir_name and period_key).
+        Every written file is reported to `progress`. A file which can't be written is reported there with
+        the error too, and the export goes on with the other files.
+
+        Attributes
+        ----------
+        cache : JsonLinesCache or SqliteCache
+             The exported cache
+        export_dir : str
+             Directory of the files
+        by: str
+             'day' or 'week'
+        formats: tuple
+             Formats of the files: 'html' and/or 'pdf'
+        workers: int
+             Number of worker processes
+        progress: function
+             Function called with (file path, number of its news, seconds, files written, news read,
+             error message or None)
+
+        Methods
+        -------
+        export(self, date_from, date_to, rss_sources):
+            Write the files of all periods of the range
+        """
+
+    def __init__(self, cache, export_dir, by="day", formats=("html",), workers=None, progress=None):
+        self.cache = cache
+        self.export_dir = export_dir
+        self.by = by
+        self.formats = tuple(formats)
+        self.workers = workers or os.cpu_count() or 1
+        self.progress = progress
+        self.files = 0
+        self.entries = 0
+        self.failed = []
+        self.paths = {}
+
+    def export(self, date_from=None, date_to=None, rss_sources=None) -> dict:
+        """
+        Write the files of all periods of the range
+        :param int date_from: first published date in %Y%m%d format or None
+        :param int date_to: last published date in %Y%m%d format or None
+        :param list rss_sources: RSS URLs or None for all sources
+        :return: dictionary {"files": number of files, "entries": number of news, "seconds": elapsed time,
+                             "failed": list of (file path, error message) of the files which are not written}
+        """
+        start = time.perf_counter()
+        self.files, self.entries, self.failed, self.paths = 0, 0, [], {}
+        futures = set()
+        with stats.timer("export"), ProcessPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                period, groups = None, {}
+                for entry in SearchIndex(self.cache).iter_range(date_from, date_to, rss_sources):
+                    entry_period = period_key(entry.pop("day"), self.by)
+                    if entry_period != period:
+                        futures = self._submit(executor, futures, period, groups)
+                        period, groups = entry_period, {}
+                    groups.setdefault(entry.get("rss_source"), []).append(entry)
+                futures = self._submit(executor, futures, period, groups)
+                self._collect(futures)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        stats.increment("files_exported", self.files)
+        stats.increment("files_failed", len(self.failed))
+        return {"files": self.files, "entries": self.entries, "seconds": time.perf_counter() - start,
+                "failed": self.failed}
+
+    def _submit(self, executor, futures, period, groups) -> set:
+        for rss_source, entries in groups.items():
+            self.entries += len(entries)
+            for file_format in self.formats:
+                if len(futures) >= 2 * self.workers:
+                    done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                    self._collect(done)
+                file_path = path.join(self.export_dir, source_dir_name(rss_source), f"{period}.{file_format}")
+                future = executor.submit(write_export_file, file_path, file_format, entries)
+                self.paths[future] = file_path
+                futures.add(future)
+        return futures
+
+    def _collect(self, done):
+        for future in done:
+            file_path = self.paths.pop(future)
+            try:
+                file_path, number, seconds = future.result()
+                error = None
+                self.files += 1
+            except Exception as exc:
+                number, seconds, error = 0, 0.0, str(exc).strip() or type(exc).__name__
+                self.failed.append((file_path, error))
+            if self.progress is not None:
+                self.progress(file_path, number, seconds, self.files, self.entries, error)
@@ -0,0 +1,458 @@
+import json
+import multiprocessing
+import os
+import re
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from hashlib import blake2b
+from itertools import chain, repeat
+from os import path
+from http.client import HTTPException
+from urllib.parse import urlparse
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+sys.path.append(path.dirname(SCRIPT_DIR))
+
+from reader.rss_exeptions import RssReaderHttpException
+from reader.rss_http import default_client
+from reader.rss_model import entry_to_json
+from reader.rss_stats import stats
+
+__WORKERS__ = 16
+__TIMEOUT__ = 30
+__VALIDATORS_FILE__ = "validators.json"
+__MEMO_FILE__ = "feed_memo.sqlite3"
+__MEMO_SIZE__ = 32 * 1024 * 1024
+__MEMO_FEED_KEYS__ = ("title", "ttl", "sy_updateperiod", "sy_updatefrequency")
+__SQLITE_TIMEOUT__ = 60
+__PARALLEL_PARSE_SIZE__ = 1024 * 1024
+__PARSE_POOLS__ = {}
+__PARSE_POOLS_LOCK__ = threading.Lock()
+__ITEM_PATTERN__ = re.compile(rb"<(item|entry)(?:\s[^>]*)?>.*?</\1\s*>", re.S)
+__RAW_ENTRY_KEYS__ = ("id", "title", "link", "published", "published_parsed", "summary")
+
+
+class ValidatorStore:
+    """
+        A class to represent persisted HTTP validators (ETag and Last-Modified) of feeds.
+
+        The validators are stored next to the news cache and sent with the next fetch, so an unchanged
+        feed is answered with '304 Not Modified' without a body. The store also counts requests and
+        '304' answers, which gives the hit rate of conditional requests.
+
+        Attributes
+        ----------
+        store_path : str
+             Path to the json file with validators
+        sources: dict
+             Validators by RSS URL: {"etag": ..., "modified": ...}
+        requests: int
+             Number of conditional requests in this run
+        not_modified: int
+             Number of '304 Not Modified' answers in this run
+        bytes_saved: int
+             Size of feed bodies which were not downloaded in this run
+
+        Methods
+        -------
+        get(self, rss_source):
+            Return (etag, modified) of the feed
+        update(self, rss_source, news_feed):
+            Remember validators of the fetched feed and count the request
+        forget(self, rss_source):
+            Drop validators of the feed, so it is fetched unconditionally next time
+        save(self):
+            Write validators and counters to the file
+        """
+
+    def __init__(self, cache_path):
+        """
+        The initialization method for the ValidatorStore instance.
+        :param str cache_path: path to the news cache, the validators are stored in the same directory
+        """
+        self.store_path = path.join(path.dirname(cache_path), __VALIDATORS_FILE__)
+        self.sources = {}
+        self.total_requests = 0
+        self.total_not_modified = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+        if path.isfile(self.store_path):
+            try:
+                with open(self.store_path, "r", encoding="utf-8") as infile:
+                    file_data = json.load(infile)
+                self.sources = file_data.get("sources", {})
+                self.total_requests = file_data.get("requests", 0)
+                self.total_not_modified = file_data.get("not_modified", 0)
+            except ValueError:
+                pass
+
+    def get(self, rss_source) -> tuple:
+        """
+        Return validators of the feed
+        :param str rss_source: RSS URL
+        :return: (etag, modified), the values are None if unknown
+        """
+        validators = self.sources.get(rss_source, {})
+        return validators.get("etag"), validators.get("modified")
+
+    def update(self, rss_source, news_feed):
+        """
+        Remember validators of the fetched feed and count the request
+        :param str rss_source: RSS URL
+        :param news_feed: fetched feed
+        """
+        if "status" not in news_feed:
+            return
+        self.requests += 1
+        if news_feed.status == 304:
+            self.not_modified += 1
+            self.bytes_saved += self.sources.get(rss_source, {}).get("length", 0)
+        elif news_feed.status == 200:
+            validators = {key: news_feed.get(key) for key in ("etag", "modified") if news_feed.get(key)}
+            if validators:
+                validators["length"] = news_feed.get("length", 0)
+                self.sources[rss_source] = validators
+            else:
+                self.sources.pop(rss_source, None)
+
+    def forget(self, rss_source):
+        """
+        Drop validators of the feed, e.g. when its entries were not cached, so it is fetched
+        unconditionally next time
+        :param str rss_source: RSS URL
+        """
+        self.sources.pop(rss_source, None)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.not_modified / self.requests if self.requests else 0.0
+
+    def save(self):
+        """
+        Write validators and counters to the file
+        """
+        directory = path.dirname(self.store_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file_data = {"sources": self.sources,
+                     "requests": self.total_requests + self.requests,
+                     "not_modified": self.total_not_modified + self.not_modified}
+        tmp_path = f"{self.store_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as outfile:
+            json.dump(file_data, outfile, ensure_ascii=False)
+        os.replace(tmp_path, self.store_path)
+
+
+def body_digest(body) -> str:
+    """
+    Return the hash of a fetched feed body
+    :param bytes body: rss document
+    :return: 32 hex digits
+    """
+    return blake2b(body, digest_size=16).hexdigest()
+
+
+class FeedMemo:
+    """
+        A class to represent an on-disk memo of normalized entries of fetched feeds by the hash of their body.
+
+        Many servers don't answer conditional requests with '304 Not Modified' and send the same body again.
+        The memo turns such a body into the entries normalized by RssReader the last time, so an unchanged
+        feed costs one hash instead of parsing with feedparser and normalizing dates. The memo is a SQLite
+        database next to the news cache; when its entries grow over `max_size` bytes, the least recently
+        used feeds are evicted. Hits, misses and evictions are counted in rss_stats.stats as `feed_memo_hits`,
+        `feed_memo_misses` and `feed_memo_evictions`.
+
+        Attributes
+        ----------
+        db_path : str
+             Path to the SQLite database of the memo
+        max_size : int
+             Maximum size of the memoized feeds in bytes
+        hits : int
+             Number of fetched bodies found in the memo in this run
+        misses : int
+             Number of fetched bodies which had to be parsed in this run
+
+        Methods
+        -------
+        get(self, rss_source, digest):
+            Return the memoized feed of a body
+        put(self, rss_source, news_feed, entries):
+            Remember normalized entries of a parsed body evicting the least recently used feeds
+        """
+
+    def __init__(self, cache_path, max_size=__MEMO_SIZE__):
+        """
+        The initialization method for the FeedMemo instance.
+        :param str cache_path: path to the news cache, the memo is stored in the same directory
+        :param int max_size: maximum size of the memoized feeds in bytes
+        """
+        self.db_path = path.join(path.dirname(cache_path), __MEMO_FILE__)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        directory = path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=__SQLITE_TIMEOUT__, isolation_level=None)
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS feeds (
+                rss_source TEXT,
+                digest TEXT,
+                feed TEXT NOT NULL,
+                size INTEGER,
+                used INTEGER,
+                PRIMARY KEY (rss_source, digest)
+            );
+            CREATE INDEX IF NOT EXISTS feeds_used ON feeds (used);
+        """)
+        return connection
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0
+
+    def get(self, rss_source, digest):
+        """
+        Return the memoized feed of a body and mark it as recently used, it can be called by threads
+        :param str rss_source: RSS URL
+        :param str digest: hash of the body (see body_digest)
+        :return: dictionary {"feed": {...}, "entries": [...]} with normalized entries or None
+        """
+        with closing(self.connect()) as connection:
+            row = connection.execute("SELECT feed FROM feeds WHERE rss_source = ? AND digest = ?",
+                                     (rss_source, digest)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE feeds SET used = (SELECT max(used) + 1 FROM feeds) "
+                                   "WHERE rss_source = ? AND digest = ?", (rss_source, digest))
+        with self.lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        stats.increment("feed_memo_misses" if row is None else "feed_memo_hits")
+        return None if row is None else json.loads(row[0])
+
+    def put(self, rss_source, news_feed, entries):
+        """
+        Remember normalized entries of a parsed body evicting the least recently used feeds
+        :param str rss_source: RSS URL
+        :param news_feed: parsed feed with the 'digest' of its body
+        :param list entries: all normalized entries of the feed as dictionaries
+        """
+        feed = {key: news_feed.feed[key] for key in __MEMO_FEED_KEYS__ if key in news_feed.feed}
+        text = json.dumps({"feed": feed, "entries": entries}, ensure_ascii=False, default=entry_to_json)
+        size = len(text.encode("utf-8"))
+        if size > self.max_size:
+            return
+        evicted = 0
+        with closing(self.connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute("INSERT OR REPLACE INTO feeds (rss_source, digest, feed, size, used) "
+                                   "VALUES (?, ?, ?, ?, (SELECT coalesce(max(used), 0) + 1 FROM feeds))",
+                                   (rss_source, news_feed["digest"], text, size))
+                total = connection.execute("SELECT sum(size) FROM feeds").fetchone()[0]
+                if total > self.max_size:
+                    for rowid, row_size in connection.execute("SELECT rowid, size FROM feeds ORDER BY used").fetchall():
+                        if total <= self.max_size:
+                            break
+                        connection.execute("DELETE FROM feeds WHERE rowid = ?", (rowid,))
+                        total -= row_size
+                        evicted += 1
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        if evicted:
+            stats.increment("feed_memo_evictions", evicted)
+
+
+def parse_pool(workers):
+    """
+    Return the process pool of feed parsing with the given number of workers.
+    The pool is created once and shared by all feeds, so the processes are started only once. It can be
+    called by several fetching threads at once. The processes are started with forkserver (or spawn where
+    there is no forkserver), as forking a process with running threads may deadlock the child.
+    :param int workers: number of processes
+    :return: ProcessPoolExecutor
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    with __PARSE_POOLS_LOCK__:
+        if workers not in __PARSE_POOLS__:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            __PARSE_POOLS__[workers] = ProcessPoolExecutor(max_workers=workers,
+                                                           mp_context=multiprocessing.get_context(method))
+        return __PARSE_POOLS__[workers]
+
+
+def compact_raw_entry(entry) -> dict:
+    """
+    Keep only the fields of an entry of feedparser which RssReader normalizes, so that it is cheap
+    to send the entry from a process of the pool
+    :param entry: entry of feedparser
+    :return: dictionary
+    """
+    raw_entry = {key: entry[key] for key in __RAW_ENTRY_KEYS__ if key in entry}
+    raw_entry["links"] = [{"href": link.get("href"), "type": link.get("type")} for link in entry.get("links", ())]
+    return raw_entry
+
+
+def parse_chunk(document, response_headers=None) -> list:
+    """
+    Parse a document with a chunk of items of a feed in a process of the pool
+    :return: list of entries (see compact_raw_entry)
+    """
+    import feedparser
+
+    return [compact_raw_entry(entry) for entry in feedparser.parse(document, response_headers=response_headers).entries]
+
+
+@stats.timed()
+def parse_feed(body, response_headers=None, workers=None):
+    """
+    Parse rss with feedparser.
+    A document larger than __PARALLEL_PARSE_SIZE__ bytes is parsed by a pool of `workers` processes:
+    its items (<item> or <entry>) are split into chunks, every chunk is wrapped into the head and the tail
+    of the document and parsed separately, and the entries are merged in the order of the document.
+    If the items can't be split reliably (e.g. an item tag inside CDATA), the document is parsed as a whole.
+    :param bytes body: rss document
+    :param dict response_headers: HTTP headers of the document
+    :param int workers: number of processes or None to parse the document in this process
+    :return: feedparser.FeedParserDict
+    """
+    import feedparser
+
+    if workers is None or workers < 2 or len(body) < __PARALLEL_PARSE_SIZE__:
+        return feedparser.parse(body, response_headers=response_headers)
+    spans = [match.span() for match in __ITEM_PATTERN__.finditer(body)]
+    if len(spans) < 2:
+        return feedparser.parse(body, response_headers=response_headers)
+
+    head, tail = body[:spans[0][0]], body[spans[-1][1]:]
+    chunk_count = min(len(spans), workers * 4)
+    bounds = [spans[len(spans) * number // chunk_count][0] for number in range(chunk_count)] + [spans[-1][1]]
+    chunks = parse_pool(workers).map(parse_chunk, [head + body[start:stop] + tail
+                                                   for start, stop in zip(bounds, bounds[1:])],
+                                     repeat(response_headers))
+    news_feed = feedparser.parse(head + tail, response_headers=response_headers)
+    entries = list(chain.from_iterable(chunks))
+    if len(entries) != len(spans):
+        return feedparser.parse(body, response_headers=response_headers)
+    news_feed["entries"] = entries
+    return news_feed
+
+
+@stats.timed()
+def fetch_feed(rss_source, timeout=__TIMEOUT__, etag=None, modified=None, client=None, parse_workers=None,
+               memo=None):
+    """
+    Download rss with the pooled HTTP client (see rss_http.HttpClient) and parse it with feedparser.
+    Errors are not raised: like feedparser.parse, a feed without entries and with 'bozo_exception' is returned.
+    If the server answers '304 Not Modified' to the conditional request, the feed has status 304 and no entries.
+    If the memo is given, the body is hashed first: a body found in the memo is not parsed, the feed has
+    normalized entries and 'memoized' is set; otherwise the feed has the 'digest' of the body, so RssReader
+    can remember its normalized entries (see RssReader.memoize).
+    :param str rss_source: RSS URL or path to a local file
+    :param float timeout: timeout in seconds for downloading the feed, including redirects
+    :param str etag: ETag of the previous response
+    :param str modified: Last-Modified of the previous response
+    :param HttpClient client: HTTP client, the shared one of the process by default
+    :param int parse_workers: number of processes parsing a large feed (see parse_feed)
+    :param FeedMemo memo: memo of parsed feeds or None
+    :return: feedparser.FeedParserDict
+    """
+    import feedparser
+
+    if urlparse(rss_source).scheme not in ("http", "https"):
+        if parse_workers is not None and path.isfile(rss_source):
+            with open(rss_source, "rb") as infile:
+                return parse_feed(infile.read(), {"content-location": rss_source}, parse_workers)
+        return feedparser.parse(rss_source)
+
+    request_headers = {"User-Agent": feedparser.USER_AGENT, "Accept": feedparser.http.ACCEPT_HEADER}
+    if etag:
+        request_headers["If-None-Match"] = etag
+    if modified:
+        request_headers["If-Modified-Since"] = modified
+
+    try:
+        response = (client or default_client).get(rss_source, request_headers, timeout)
+    except (RssReaderHttpException, HTTPException, OSError, ValueError) as exc:
+        news_feed = feedparser.parse(b"")
+        news_feed["bozo"] = True
+        news_feed["bozo_exception"] = exc
+        return news_feed
+
+    if response.status >= 300:
+        news_feed = feedparser.parse(b"")
+        news_feed["status"] = response.status
+        if response.status != 304:
+            news_feed["bozo"] = True
+            news_feed["bozo_exception"] = RssReaderHttpException(f"HTTP Error {response.status}")
+        return news_feed
+
+    body = response.body
+    status = response.status
+    headers = {name: value for name, value in response.headers.items() if name != "content-encoding"}
+    headers.setdefault("content-location", response.url)
+    stats.increment("bytes_fetched", len(body))
+    digest = None if memo is None else body_digest(body)
+    memoized = None if memo is None else memo.get(rss_source, digest)
+    if memoized is not None:
+        news_feed = feedparser.FeedParserDict(feed=feedparser.FeedParserDict(memoized["feed"]),
+                                              entries=memoized["entries"], bozo=False, headers=headers,
+                                              memoized=True)
+    else:
+        news_feed = parse_feed(body, headers, parse_workers)
+        if digest is not None:
+            news_feed["digest"] = digest
+    news_feed["href"] = rss_source
+    news_feed["status"] = status
+    news_feed["length"] = len(body)
+    if "etag" in headers:
+        news_feed["etag"] = headers["etag"]
+    if "last-modified" in headers:
+        news_feed["modified"] = headers["last-modified"]
+    return news_feed
+
+
+@stats.timed()
+def fetch_feeds(rss_sources, workers=__WORKERS__, timeout=__TIMEOUT__, validators=None, parse_workers=None,
+                memo=None) -> list:
+    """
+    Download and parse several rss concurrently with a bounded pool of threads
+    :param rss_sources: list of RSS URLs
+    :param int workers: maximum number of feeds fetched at the same time
+    :param float timeout: timeout in seconds for every feed
+    :param ValidatorStore validators: validators for conditional requests, updated with the new ones
+    :param int parse_workers: number of processes parsing large feeds (see parse_feed)
+    :param FeedMemo memo: memo of parsed feeds, unchanged bodies are not parsed (see fetch_feed)
+    :return: list of (rss_source, feedparser.FeedParserDict) in the order of rss_sources
+    """
+    if not rss_sources:
+        return []
+
+    def fetch(rss_source):
+        etag, modified = validators.get(rss_source) if validators is not None else (None, None)
+        return fetch_feed(rss_source, timeout, etag, modified, parse_workers=parse_workers, memo=memo)
+
+    if parse_workers is not None and parse_workers >= 2:
+        # the pool is created before the threads, so that they only share it
+        parse_pool(parse_workers)
+    with ThreadPoolExecutor(max_workers=min(workers, len(rss_sources))) as executor:
+        fetched = list(zip(rss_sources, executor.map(fetch, rss_sources)))
+
+    if validators is not None:
+        for rss_source, news_feed in fetched:
+            validators.update(rss_source, news_feed)
+    return fetched
@@ -0,0 +1,332 @@
+import base64
+import http.client
+import importlib.util
+import sys
+import threading
+import time
+import urllib.request
+import zlib
+from os import path
+from urllib.parse import unquote, urljoin, urlsplit
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+sys.path.append(path.dirname(SCRIPT_DIR))
+
+from reader.rss_exeptions import RssReaderHttpException
+from reader.rss_stats import stats
+
+__POOL_SIZE__ = 4
+__MAX_BODY_SIZE__ = 16 * 1024 * 1024
+__MAX_REDIRECTS__ = 5
+__CHUNK_SIZE__ = 64 * 1024
+__TIMEOUT__ = 30
+__REDIRECT_STATUSES__ = (301, 302, 303, 307, 308)
+
+
+class BodyDecoder:
+    """
+        A class to represent the incremental decoding of a compressed response body.
+
+        Chunks are decompressed as they arrive and the decoded size is checked on the way, so a small
+        compressed body can't expand into more than `max_size` bytes in memory.
+
+        Methods
+        -------
+        feed(self, chunk):
+            Return the decoded bytes of the next chunk
+        flush(self):
+            Return the rest of decoded bytes
+        """
+
+    def __init__(self, encoding, max_size=__MAX_BODY_SIZE__):
+        """
+        The initialization method for the BodyDecoder instance.
+        :param str encoding: value of Content-Encoding: gzip, deflate, br or identity
+        :param int max_size: maximum size of the decoded body in bytes
+        """
+        self.encoding = (encoding or "identity").strip().lower()
+        self.max_size = max_size
+        self.size = 0
+        self.first_chunk = True
+        if self.encoding in ("gzip", "x-gzip"):
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == "deflate":
+            self.decompressor = zlib.decompressobj()
+        elif self.encoding == "br":
+            if importlib.util.find_spec("brotli") is None:
+                raise RssReaderHttpException("The response is compressed with brotli, which is not installed")
+            import brotli
+
+            self.decompressor = brotli.Decompressor()
+        elif self.encoding == "identity":
+            self.decompressor = None
+        else:
+            raise RssReaderHttpException(f"Unsupported Content-Encoding: {encoding}")
+
+    def _count(self, data) -> bytes:
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise RssReaderHttpException(f"The response body is larger than {self.max_size} bytes")
+        return data
+
+    def feed(self, chunk) -> bytes:
+        """
+        Return the decoded bytes of the next chunk
+        :param bytes chunk: chunk of the body as it was received
+        :return: decoded bytes
+        """
+        if self.decompressor is None:
+            return self._count(chunk)
+        if self.encoding == "br":
+            return self._count(self.decompressor.process(chunk))
+        if self.encoding == "deflate" and self.first_chunk:
+            self.first_chunk = False
+            try:
+                return self._inflate(chunk)
+            except zlib.error:
+                # some servers send raw deflate without the zlib header
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._inflate(chunk)
+
+    def _inflate(self, chunk) -> bytes:
+        parts = []
+        while chunk:
+            parts.append(self._count(self.decompressor.decompress(chunk, self.max_size - self.size + 1)))
+            chunk = self.decompressor.unconsumed_tail
+        return b"".join(parts)
+
+    def flush(self) -> bytes:
+        """
+        Return the rest of decoded bytes
+        :return: decoded bytes
+        """
+        if self.decompressor is None or self.encoding == "br":
+            return b""
+        return self._count(self.decompressor.flush())
+
+
+def remaining_time(deadline) -> float:
+    """
+    Return the time left for a download, so every socket operation waits at most until the deadline
+    :param float deadline: time.perf_counter() value by which the download has to be finished
+    :return: seconds
+    """
+    remaining = deadline - time.perf_counter()
+    if remaining <= 0:
+        raise RssReaderHttpException("The download is not finished within the timeout")
+    return remaining
+
+
+class HttpResponse:
+    """
+        A class to represent a downloaded response.
+
+        Attributes
+        ----------
+        url : str
+             URL of the response after redirects
+        status : int
+             HTTP status code
+        headers: dict
+             Headers with lowercase names
+        body: bytes
+             Decoded body
+        """
+
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class HttpClient:
+    """
+        A class to represent an HTTP client with a pool of keep-alive connections per host.
+
+        A connection is taken from the pool of its (scheme, host, port) and returned there after the body
+        is read, so feeds polled on the same host don't pay the TCP and TLS handshakes again. A reused
+        connection which the server has closed meanwhile is replaced with a new one once. The client
+        advertises gzip and deflate (and brotli if it is installed), streams the body in chunks,
+        decompresses it on the way and stops at `max_body_size` bytes. The latency of every request
+        is recorded by host in rss_stats.stats. The client can be shared by threads.
+        Proxies are taken from the environment as urllib does (http_proxy, https_proxy and no_proxy, see
+        urllib.request.getproxies()): an http request is sent to the proxy with the absolute URL, an https
+        request is tunnelled through the proxy with CONNECT. Only http proxies are supported.
+
+        Attributes
+        ----------
+        pool_size : int
+             Maximum number of idle connections kept per host
+        max_body_size : int
+             Maximum size of a body in bytes, both compressed and decoded
+        pools: dict
+             Idle connections by (scheme, host, port, proxy)
+        proxies: dict
+             Proxy URLs by scheme, 'no' holds the hosts which are accessed directly
+
+        Methods
+        -------
+        get(self, url, headers, timeout):
+            Download the URL following redirects within the timeout
+        close(self):
+            Close all idle connections
+        """
+
+    def __init__(self, pool_size=__POOL_SIZE__, max_body_size=__MAX_BODY_SIZE__, proxies=None):
+        self.pool_size = pool_size
+        self.max_body_size = max_body_size
+        self.pools = {}
+        self.proxies = urllib.request.getproxies() if proxies is None else proxies
+        self.lock = threading.Lock()
+        self.accept_encoding = "gzip, deflate, br" if importlib.util.find_spec("brotli") else "gzip, deflate"
+
+    def get(self, url, headers=None, timeout=__TIMEOUT__) -> HttpResponse:
+        """
+        Download the URL following redirects within the timeout
+        :param str url: http or https URL
+        :param dict headers: request headers
+        :param float timeout: timeout in seconds for the whole download, including redirects
+        :return: HttpResponse
+        """
+        deadline = time.perf_counter() + timeout
+        for _ in range(__MAX_REDIRECTS__ + 1):
+            response = self._request(url, headers or {}, deadline)
+            location = response.headers.get("location")
+            if response.status not in __REDIRECT_STATUSES__ or not location:
+                return response
+            url = urljoin(url, location)
+        raise RssReaderHttpException(f"More than {__MAX_REDIRECTS__} redirects")
+
+    def _request(self, url, headers, deadline) -> HttpResponse:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise RssReaderHttpException(f"Unsupported URL: {url}")
+        proxy = self._proxy(parts)
+        key = (parts.scheme, parts.hostname, parts.port, proxy)
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+        headers = {"Accept-Encoding": self.accept_encoding, "Connection": "keep-alive", **headers}
+        if proxy is not None and parts.scheme == "http":
+            target = f"http://{parts.netloc}{target}"
+            if proxy[2] is not None:
+                headers["Proxy-Authorization"] = proxy[2]
+
+        start = time.perf_counter()
+        connection, reused = self._acquire(key, remaining_time(deadline))
+        try:
+            try:
+                connection.request("GET", target, headers=headers)
+                response = connection.getresponse()
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                if not reused:
+                    raise
+                # the server closed the idle connection, the request is sent again on a new one
+                connection, reused = self._connect(key, remaining_time(deadline)), False
+                connection.request("GET", target, headers=headers)
+                response = connection.getresponse()
+            body = self._read_body(response, connection, deadline)
+        except Exception:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+        stats.record_host(parts.hostname, time.perf_counter() - start)
+        stats.increment("connections_reused" if reused else "connections_opened")
+        return HttpResponse(url, response.status, {name.lower(): value for name, value in response.getheaders()},
+                            body)
+
+    def _read_body(self, response, connection, deadline) -> bytes:
+        length = response.getheader("Content-Length")
+        if length is not None and length.isdigit() and int(length) > self.max_body_size:
+            raise RssReaderHttpException(f"The response body is larger than {self.max_body_size} bytes")
+        decoder = BodyDecoder(response.getheader("Content-Encoding"), self.max_body_size)
+        chunks = []
+        received = 0
+        while True:
+            if connection.sock is not None:
+                connection.sock.settimeout(remaining_time(deadline))
+            chunk = response.read1(__CHUNK_SIZE__)
+            if not chunk:
+                break
+            received += len(chunk)
+            if received > self.max_body_size:
+                raise RssReaderHttpException(f"The response body is larger than {self.max_body_size} bytes")
+            chunks.append(decoder.feed(chunk))
+        # completes the response, so the connection can be reused
+        response.read()
+        chunks.append(decoder.flush())
+        stats.increment("bytes_received", received)
+        return b"".join(chunks)
+
+    def _proxy(self, parts):
+        """
+        Return the proxy of the URL
+        :param parts: result of urlsplit() of the URL
+        :return: (host, port, value of Proxy-Authorization or None) or None if the URL is accessed directly
+        """
+        proxy = self.proxies.get(parts.scheme)
+        if not proxy:
+            return None
+        if "no" in self.proxies:
+            bypass = urllib.request.proxy_bypass_environment(parts.netloc, self.proxies)
+        else:
+            bypass = urllib.request.proxy_bypass(parts.netloc)
+        if bypass:
+            return None
+        proxy_parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+        if proxy_parts.scheme != "http" or not proxy_parts.hostname:
+            raise RssReaderHttpException(f"Unsupported proxy: {proxy}")
+        authorization = None
+        if proxy_parts.username is not None:
+            credentials = f"{unquote(proxy_parts.username)}:{unquote(proxy_parts.password or '')}"
+            authorization = f"Basic {base64.b64encode(credentials.encode('utf-8')).decode('ascii')}"
+        return proxy_parts.hostname, proxy_parts.port or 80, authorization
+
+    def _connect(self, key, timeout):
+        scheme, host, port, proxy = key
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        if proxy is None:
+            return connection_class(host, port, timeout=timeout)
+        proxy_host, proxy_port, authorization = proxy
+        connection = connection_class(proxy_host, proxy_port, timeout=timeout)
+        if scheme == "https":
+            connection.set_tunnel(host, port, headers=None if authorization is None
+                                  else {"Proxy-Authorization": authorization})
+        return connection
+
+    def _acquire(self, key, timeout) -> tuple:
+        with self.lock:
+            idle = self.pools.get(key)
+            connection = idle.pop() if idle else None
+        if connection is None:
+            return self._connect(key, timeout), False
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection, True
+
+    def _release(self, key, connection):
+        with self.lock:
+            idle = self.pools.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """
+        Close all idle connections
+        """
+        with self.lock:
+            pools, self.pools = self.pools, {}
+        for idle in pools.values():
+            for connection in idle:
+                connection.close()
+
+
+default_client = HttpClient()
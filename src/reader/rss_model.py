@@ -0,0 +1,185 @@
+import json
+import math
+import sys
+from os import path
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+sys.path.append(path.dirname(SCRIPT_DIR))
+
+
+class Link:
+    """
+        A class to represent a link of a news.
+
+        It supports read-only access by key (link['href']), so it can be used wherever a dictionary
+        of a link was used.
+
+        Attributes
+        ----------
+        index : int
+             Number of the link in the news, starting with 1
+        href : str
+             URL
+        type: str
+             MIME type, the string is interned
+
+        Methods
+        -------
+        to_dict(self):
+            Return the link as a dictionary
+        from_dict(link_json):
+            Create a link from a dictionary
+        """
+
+    __slots__ = ("index", "href", "type")
+    fields = __slots__
+
+    def __init__(self, index, href, type):
+        self.index = index
+        self.href = href
+        self.type = sys.intern(type) if isinstance(type, str) else type
+
+    def keys(self):
+        return self.fields
+
+    def __getitem__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        if isinstance(other, (Link, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Link({self.index!r}, {self.href!r}, {self.type!r})"
+
+    def to_dict(self) -> dict:
+        return {"index": self.index, "href": self.href, "type": self.type}
+
+    @classmethod
+    def from_dict(cls, link_json):
+        return cls(link_json.get("index"), link_json.get("href"), link_json.get("type"))
+
+
+class Entry:
+    """
+        A class to represent a normalized news.
+
+        The attributes are kept in slots instead of a dictionary per news, and the RSS URL and the feed
+        title are interned, so all news of a feed share one copy of them. Optional fields which the feed
+        does not provide are None and are left out of keys() and to_dict(). The read-only mapping interface
+        (entry['title'], entry.get('summary'), entry.keys()) lets the news be used wherever a dictionary
+        of a news was used.
+
+        Attributes
+        ----------
+        rss_source : str
+             RSS URL
+        feed : str
+             Feed title
+        title: str
+             Title of the news or None
+        date: str
+             Normalized publish date or None
+        link: str
+             Link of the news or None
+        id: str
+             Identifier (guid) of a news which has no link or None, it identifies the news in the cache
+        summary: str
+             Summary of the news or None
+        links: list
+             Links of the news (Link instances)
+
+        Methods
+        -------
+        keys(self):
+            Return names of the fields the news has
+        to_dict(self):
+            Return the news as a dictionary
+        from_dict(entry_json):
+            Create a news from a dictionary, e.g. read from the cache
+        """
+
+    __slots__ = ("rss_source", "feed", "title", "date", "link", "id", "summary", "links")
+    fields = __slots__
+
+    def __init__(self, rss_source, feed, title=None, date=None, link=None, summary=None, links=(), id=None):
+        self.rss_source = sys.intern(rss_source) if isinstance(rss_source, str) else rss_source
+        self.feed = sys.intern(feed) if isinstance(feed, str) else feed
+        self.title = title
+        self.date = date
+        self.link = link
+        self.id = id
+        self.summary = summary
+        self.links = list(links)
+
+    def keys(self):
+        return [field for field in self.fields if field == "links" or getattr(self, field) is not None]
+
+    def __getitem__(self, key):
+        value = getattr(self, key) if key in self.fields else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key in self.fields and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key) if key in self.fields else None
+        return default if value is None else value
+
+    def __eq__(self, other):
+        if isinstance(other, Entry):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Entry({self.to_dict()!r})"
+
+    def to_dict(self) -> dict:
+        entry_json = {field: getattr(self, field) for field in self.keys()}
+        entry_json["links"] = [link.to_dict() for link in self.links]
+        return entry_json
+
+    @classmethod
+    def from_dict(cls, entry_json):
+        values = {field: entry_json.get(field) for field in cls.fields}
+        for field, value in values.items():
+            if isinstance(value, float) and math.isnan(value):
+                values[field] = None
+        values["links"] = [Link.from_dict(link) for link in (() if values["links"] is None else values["links"])]
+        return cls(**values)
+
+
+def entry_to_json(obj):
+    """
+    Convert Entry and Link for json.dumps(default=entry_to_json)
+    :param obj: object which json can't serialize
+    :return: dictionary
+    """
+    if isinstance(obj, (Entry, Link)):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def as_dict(entry):
+    """
+    Return a news as a dictionary
+    :param entry: Entry or dictionary
+    :return: dictionary
+    """
+    return entry.to_dict() if isinstance(entry, Entry) else entry
+
+
+def dumps_entry(entry) -> str:
+    """
+    Serialize a news as one line of JSON
+    :param entry: Entry or dictionary
+    :return: str
+    """
+    return json.dumps(as_dict(entry), ensure_ascii=False, default=entry_to_json)
@@ -1,11 +1,20 @@
 import sys
 import os
+from itertools import chain
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
-from reader.rss_utils import parse_argument, pass_to_html, pass_to_pdf
-from reader.rss_entities import RssReader
+from reader.rss_utils import (parse_argument, read_sources_file, report_suppressed_exception, print_diagnostic,
+                              send_diagnostics_to_stderr, JsonStreamWriter)
+from reader.rss_entities import RssReader, __JSON_FILE__
+from reader.rss_fetcher import FeedMemo, ValidatorStore, fetch_feeds
+from reader.rss_daemon import RssDaemon
+from reader.rss_cache import open_cache, ParquetSnapshot
+from reader.rss_exeptions import RssReaderCacheException, RssReaderException
+from reader.rss_stats import stats
+from reader.rss_retention import CacheMaintenance, RetentionPolicy
+from reader.rss_export import BulkExporter
 
 
 def main():
@@ -13,60 +22,176 @@ def main():
     Main method for rss_reader.
 
     Procedure:
-    - getting command line arguments
+    - getting command line arguments and RSS URLs from the sources file
+    - if a retention argument is set (keep_days, keep_per_source, max_cache_size):
+          -- saving the retention policy of the cache, the cache is pruned by it when its thresholds are crossed
+    - if prune_cache argument is set:
+          -- deduplicating the cache, dropping news by the retention policy and rewriting the cache
+    - if compact_cache argument is set:
+          -- compacting the json cache into Parquet files partitioned by date and source
+    - if rebuild_index argument is set:
+          -- building the offset index of the json cache again
+    - if export_dir argument is set:
+          -- reading cached news of the sources and the range of dates once, ordered by date
+          -- writing one html and/or pdf file per source and day (or week) by a pool of processes
+          -- reporting every written file to stderr and the total time
+    - if daemon argument is set:
+          -- polling every rss on its own schedule until interrupted, only new entries are cached and displayed
+    - if search, from or to argument is set:
+          -- updating the search index of the cache with news cached since the last search
+          -- finding cached news by keywords and the range of dates
+          -- displaying the result on the screen and writing it to html and pdf files
     - if date argument is None (means without reading cached news):
-          -- creating an object of class RssReader
+          -- fetching all rss concurrently with conditional requests, large rss are parsed in chunks
+             by a pool of parse_workers processes if it is set
+          -- hashing every fetched body, a body found in the memo of parsed feeds is not parsed again
+          -- creating an object of class RssReader for every modified rss
+          -- remembering normalized entries of every new body in the memo
           -- checking 'limit' parameter
-          -- parsing of rss
-          -- caching news to local file
-          -- displaying the result on the screen
+          -- parsing of rss entry by entry (only not cached entries if new_only argument is set),
+             every entry at once is:
+             --- cached to local file if it is not cached yet
+             --- displayed on the screen as text, or streamed as json or ndjson (format argument)
+             --- written to html file if html_path argument is not None
+             --- written to pdf file if pdf_path argument is not None
+          -- saving ETag and Last-Modified of the feeds if their entries are cached
     - if date argument is not None (means with reading cached news):
-          -- creating an object of class RssReader
+          -- creating an object of class RssReader for every RSS URL
           -- reading cached news
-          -- displaying the result on the screen
-    - if html_path argument is not None:
-          -- writing news to html file
-    - if pdf_path argument is not None:
-          -- writing news to pdf file
+          -- displaying the result on the screen and writing it to html and pdf files
+    - if stats argument is set:
+          -- printing timings of stages and counters to stderr
+    - with json and ndjson formats error messages are printed to stderr, so stdout stays parseable
     """
     args = parse_argument()
-    rss_source = args.source
-    if isinstance(rss_source, list):
-        rss_source = rss_source[0]
+    output_format = args.format or ("json" if args.json else "text")
+    if output_format != "text":
+        send_diagnostics_to_stderr()
+    try:
+        rss_sources = (args.source or []) + read_sources_file(args.sources_file)
+        feeds = read_sources_file(args.sources_file, with_intervals=True) if args.daemon else []
+    except RssReaderException as exc:
+        report_suppressed_exception(exc)
+        return
     limit = args.limit
     json = args.json
     verbose = args.verbose
     date = args.date
     html_path = args.to_html
     pdf_path = args.to_pdf
+    cache_backend = args.cache_backend
 
-    rss_json = {}
+    policy = RetentionPolicy(args.keep_days, args.keep_per_source, args.max_cache_size)
+    if not policy.is_empty():
+        maintenance = CacheMaintenance(open_cache(__JSON_FILE__, cache_backend))
+        maintenance.policy = maintenance.policy.merge(policy)
+        maintenance.save()
 
-    if date is None:
-        rss = RssReader(rss_source, limit, json, verbose, date)
-        rss.check_limit()
-        rss_json = rss.parse_rss()
-        if rss_json is not None:
-            rss.write_json(rss_json)
-            rss.print_rss(rss_json)
-    else:
-        rss = RssReader(rss_source, limit, json, verbose, date)
-        rss.check_date()
-        entries = rss.read_cashed_news()
+    if args.prune_cache:
+        try:
+            before, after = CacheMaintenance(open_cache(__JSON_FILE__, cache_backend)).prune()
+            print(f"The cache is pruned: {after} of {before} news are kept.")
+        except RssReaderCacheException as exc:
+            report_suppressed_exception(exc)
+    elif args.compact_cache or args.rebuild_index:
+        try:
+            if cache_backend != "json" and args.rebuild_index:
+                raise RssReaderCacheException("\nOnly the json cache has an offset index to rebuild.")
+            if cache_backend != "json":
+                raise RssReaderCacheException("\nOnly the json cache can be compacted.")
+            cache = open_cache(__JSON_FILE__, cache_backend)
+            if args.rebuild_index:
+                print(f"The index is rebuilt: {cache.rebuild_index()} rows.")
+            if args.compact_cache:
+                print(f"The cache is compacted: {ParquetSnapshot(cache).compact()} news.")
+        except RssReaderCacheException as exc:
+            report_suppressed_exception(exc)
+    elif args.export_dir is not None:
+        def report_progress(file_path, number, seconds, files, news, error):
+            if error is not None:
+                print(f"[{files}] {file_path}: failed: {error}", file=sys.stderr)
+            else:
+                print(f"[{files}] {file_path}: {number} news in {seconds:.2f} s", file=sys.stderr)
+
+        exporter = BulkExporter(open_cache(__JSON_FILE__, cache_backend), args.export_dir, args.export_by,
+                                args.export_format or ["html"], args.export_workers, report_progress)
+        result = exporter.export(args.date_from, args.date_to, rss_sources or None)
+        print(f"Exported {result['entries']} news to {result['files']} files in {result['seconds']:.2f} s.")
+        if result["failed"]:
+            print_diagnostic(f"Error: {len(result['failed'])} files are not written:\n"
+                             + "\n".join(f"{file_path}: {error}" for file_path, error in result["failed"]))
+    elif args.daemon:
+        feeds = [(rss_source, None) for rss_source in args.source or []] + feeds
+        daemon = RssDaemon([(rss_source, interval or args.interval) for rss_source, interval in feeds],
+                           limit, json, verbose, cache_backend, args.timeout, output_format=output_format)
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            daemon.logger_obj.info("The daemon is stopped")
+    elif args.search is not None or args.date_from is not None or args.date_to is not None:
+        entries = []
+        rss = RssReader(None, limit, json, verbose, args.date_from, cache_backend, output_format=output_format)
+        for rss_source in rss_sources or [None]:
+            source_entries = rss.search_cashed_news(args.search, args.date_from, args.date_to, rss_source)
+            if source_entries is not None:
+                entries.extend(source_entries)
 
-        if entries is None:
-            print(f"Error: no news for specified source ({rss_source}) or date ({date}).")
-        elif len(entries) != 0:
-            rss_json = {"entries": entries}
-            rss.print_rss(rss_json)
+        if len(entries) != 0:
+            rss.stream_rss(entries, html_path, pdf_path, write_cache=False, pdf_split=args.pdf_split)
         else:
-            print(f"Error: no news for specified source ({rss_source}) or date ({date}).")
+            print_diagnostic(f"Error: no news for specified source ({', '.join(rss_sources) or None}), "
+                             f"keywords ({args.search}) or dates ({args.date_from} - {args.date_to}).")
+            if output_format != "text":
+                JsonStreamWriter(output_format).close()
+    elif date is None:
+        readers = []
+        validators = ValidatorStore(__JSON_FILE__)
+        memo = FeedMemo(__JSON_FILE__)
+        for rss_source, news_feed in fetch_feeds(rss_sources, args.workers, args.timeout, validators,
+                                                 args.parse_workers, memo):
+            rss = RssReader(rss_source, limit, json, verbose, date, cache_backend, news_feed, output_format)
+            if not rss.not_modified:
+                rss.memoize(memo)
+                rss.check_limit()
+            readers.append(rss)
 
-    if html_path is not None:
-        pass_to_html(html_path, rss_json)
+        rss = RssReader(None, limit, json, verbose, date, cache_backend, output_format=output_format)
+        seen = open_cache(rss.cache_path, cache_backend).seen()
+        rss.logger_obj.info(f"Conditional GET: {validators.not_modified} of {validators.requests} feeds "
+                            f"not modified (hit rate {validators.hit_rate:.0%}, "
+                            f"{validators.bytes_saved} bytes not downloaded)")
+        rss.logger_obj.info(f"Feed memo: {memo.hits} of {memo.hits + memo.misses} fetched feeds unchanged, "
+                            f"not parsed (hit rate {memo.hit_rate:.0%})")
+        entries = chain.from_iterable(reader.iter_entries(seen if args.new_only else None) for reader in readers)
+        if rss.stream_rss(entries, html_path, pdf_path, write_cache=True, pdf_split=args.pdf_split,
+                          seen=seen) is not None:
+            for reader in readers:
+                if not reader.complete:
+                    # the entries left out by the limit are not cached, the feed must not be answered with '304'
+                    validators.forget(reader.rss_source)
+            validators.save()
+    else:
+        entries = []
+        rss = None
+        for rss_source in rss_sources or [None]:
+            rss = RssReader(rss_source, limit, json, verbose, date, cache_backend, output_format=output_format)
+            rss.check_date()
+            source_entries = rss.read_cashed_news()
+            if source_entries is not None:
+                entries.extend(source_entries)
+
+        if len(entries) != 0:
+            rss.stream_rss(entries, html_path, pdf_path, write_cache=False, pdf_split=args.pdf_split)
+        else:
+            print_diagnostic(f"Error: no news for specified source ({', '.join(rss_sources) or None}) "
+                             f"or date ({date}).")
+            if output_format != "text":
+                JsonStreamWriter(output_format).close()
 
-    if pdf_path is not None:
-        pass_to_pdf(pdf_path, rss_json)
+    if args.stats == "prometheus":
+        sys.stderr.write(stats.prometheus())
+    elif args.stats:
+        print(stats.report(), file=sys.stderr)
 
 
 if __name__ == "__main__":
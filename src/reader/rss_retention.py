@@ -0,0 +1,222 @@
+import json
+import os
+import sys
+from datetime import date, timedelta
+from os import path
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+sys.path.append(path.dirname(SCRIPT_DIR))
+
+from reader.rss_cache import SqliteCache
+from reader.rss_dates import date_key, timestamp_key
+from reader.rss_model import entry_to_json
+from reader.rss_search import SearchIndex
+from reader.rss_stats import stats
+
+__RETENTION_SUFFIX__ = ".retention.json"
+__GROWTH_FACTOR__ = 2
+__MIN_PRUNE_SIZE__ = 1024 * 1024
+__HEADROOM__ = 1.1
+
+
+class RetentionPolicy:
+    """
+        A class to represent the rules which cached news are kept by.
+
+        News are ranked from the newest to the oldest by publish time (then by the order they were cached),
+        and every rule which is set drops the rest: news older than `keep_days` days, news of a source
+        after its `keep_per_source` newest ones and news after the newest ones which fit into `max_bytes`.
+        News without a publish date can't age, so only the two last rules apply to them.
+
+        Attributes
+        ----------
+        keep_days : int
+             Number of days to keep news for or None
+        keep_per_source : int
+             Number of the newest news to keep for every source or None
+        max_bytes: int
+             Maximum size of cached news in bytes or None
+
+        Methods
+        -------
+        is_empty(self):
+            Check whether no rule is set
+        merge(self, policy):
+            Return the policy with the rules which are set in another one replaced
+        apply(self, entries, today):
+            Return the entries which are kept
+        """
+
+    def __init__(self, keep_days=None, keep_per_source=None, max_bytes=None):
+        self.keep_days = keep_days
+        self.keep_per_source = keep_per_source
+        self.max_bytes = max_bytes
+
+    def is_empty(self) -> bool:
+        return self.keep_days is None and self.keep_per_source is None and self.max_bytes is None
+
+    def merge(self, policy):
+        """
+        Return the policy with the rules which are set in another one replaced, the rest are kept
+        :param RetentionPolicy policy: the policy with new rules
+        :return: RetentionPolicy
+        """
+        return RetentionPolicy(*[self_rule if rule is None else rule for self_rule, rule
+                                 in zip(self.to_dict().values(), policy.to_dict().values())])
+
+    def to_dict(self) -> dict:
+        return {"keep_days": self.keep_days, "keep_per_source": self.keep_per_source, "max_bytes": self.max_bytes}
+
+    @classmethod
+    def from_dict(cls, policy_json):
+        return cls(policy_json.get("keep_days"), policy_json.get("keep_per_source"), policy_json.get("max_bytes"))
+
+    def apply(self, entries, today=None) -> list:
+        """
+        Return the entries which are kept
+        :param list entries: entries in the order they were cached
+        :param date today: the day the age of news is counted from, today by default
+        :return: list of the kept entries (the same objects) in the original order
+        """
+        days = [date_key(entry.get("date")) for entry in entries]
+        keep = [True] * len(entries)
+        if self.keep_days is not None:
+            cutoff = int(((today or date.today()) - timedelta(days=self.keep_days)).strftime("%Y%m%d"))
+            keep = [day is None or day > cutoff for day in days]
+
+        timestamps = [timestamp_key(entry.get("date")) for entry in entries]
+        per_source = {}
+        size = 0
+        ranks = [(timestamp is not None, timestamp or 0, number) for number, timestamp in enumerate(timestamps)]
+        for _, _, number in sorted(ranks, reverse=True):
+            if not keep[number]:
+                continue
+            if self.keep_per_source is not None:
+                rss_source = entries[number].get("rss_source")
+                per_source[rss_source] = per_source.get(rss_source, 0) + 1
+                if per_source[rss_source] > self.keep_per_source:
+                    keep[number] = False
+                    continue
+            if self.max_bytes is not None:
+                size += len(json.dumps(entries[number], ensure_ascii=False, default=entry_to_json).encode("utf-8"))
+                if size > self.max_bytes:
+                    keep[number] = False
+        return [entry for entry, kept in zip(entries, keep) if kept]
+
+
+class CacheMaintenance:
+    """
+        A class to represent the retention and compaction of a cache.
+
+        The retention policy of the cache and its size after the last pruning are kept next to the cache, separately
+        for every backend (`data/news.retention.json` for the json cache and `data/news.sqlite3.retention.json` for
+        the sqlite one, like their seen-sets). Pruning deduplicates news across fetches, drops the news which the
+        policy doesn't keep and rewrites the store (see rewrite() of the caches), the evicted news are removed from
+        the search index. After every write maybe_prune() checks cheaply whether a threshold is crossed: the cache is
+        over `max_bytes` (and has grown by __HEADROOM__ since the last pruning, as the store is a bit larger than its
+        news), it has grown __GROWTH_FACTOR__ times since the last pruning, or a day has passed and `keep_days` is
+        set. So the cache, and the time of reading it, stays bounded.
+
+        Attributes
+        ----------
+        cache : JsonLinesCache or SqliteCache
+             The maintained cache
+        state_path : str
+             Path to the json file with the policy and the state
+        policy: RetentionPolicy
+             The retention policy of the cache
+
+        Methods
+        -------
+        save(self):
+            Write the policy and the state to the file
+        prune(self, today):
+            Deduplicate the cache, apply the policy and rewrite the store
+        is_due(self, today):
+            Check whether a threshold of automatic pruning is crossed
+        maybe_prune(self, today):
+            Prune the cache if a threshold is crossed
+        """
+
+    def __init__(self, cache):
+        """
+        The initialization method for the CacheMaintenance instance.
+        :param cache: JsonLinesCache or SqliteCache
+        """
+        self.cache = cache
+        if isinstance(cache, SqliteCache):
+            self.state_path = f"{cache.db_path}{__RETENTION_SUFFIX__}"
+        else:
+            self.state_path = f"{cache.store_dir}{__RETENTION_SUFFIX__}"
+        self.policy = RetentionPolicy()
+        self.size = 0
+        self.pruned = None
+        if path.isfile(self.state_path):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as infile:
+                    state = json.load(infile)
+                self.policy = RetentionPolicy.from_dict(state.get("policy", {}))
+                self.size = state.get("size", 0)
+                self.pruned = state.get("pruned")
+            except ValueError:
+                pass
+
+    def save(self):
+        """
+        Write the policy and the state to the file
+        """
+        directory = path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as outfile:
+            json.dump({"policy": self.policy.to_dict(), "size": self.size, "pruned": self.pruned}, outfile)
+        os.replace(tmp_path, self.state_path)
+
+    def prune(self, today=None) -> tuple:
+        """
+        Deduplicate the cache, apply the policy and rewrite the store
+        :param date today: the day the age of news is counted from, today by default
+        :return: (number of news before, number of news after)
+        """
+        today = today or date.today()
+        evicted = []
+
+        def select(entries):
+            kept = self.policy.apply(entries, today)
+            kept_ids = {id(entry) for entry in kept}
+            evicted.extend(entry for entry in entries if id(entry) not in kept_ids)
+            return kept
+
+        with stats.timer("prune_cache"):
+            before, after = self.cache.rewrite(select)
+            SearchIndex(self.cache).remove(evicted)
+        self.size = self.cache.size()
+        self.pruned = int(today.strftime("%Y%m%d"))
+        self.save()
+        stats.increment("entries_evicted", before - after)
+        stats.set_gauge("cache_bytes", self.size)
+        return before, after
+
+    def is_due(self, today=None) -> bool:
+        """
+        Check whether a threshold of automatic pruning is crossed
+        :param date today: the current day, today by default
+        :return: bool
+        """
+        if self.policy.is_empty() or not self.cache.exists():
+            return False
+        size = self.cache.size()
+        if self.policy.max_bytes is not None and size > max(self.policy.max_bytes, self.size * __HEADROOM__):
+            return True
+        if size >= max(self.size, __MIN_PRUNE_SIZE__) * __GROWTH_FACTOR__:
+            return True
+        return self.policy.keep_days is not None and self.pruned != int((today or date.today()).strftime("%Y%m%d"))
+
+    def maybe_prune(self, today=None):
+        """
+        Prune the cache if a threshold is crossed
+        :param date today: the current day, today by default
+        :return: (number of news before, number of news after) or None if the cache isn't pruned
+        """
+        return self.prune(today) if self.is_due(today) else None
@@ -0,0 +1,296 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+from contextlib import closing
+from itertools import islice
+from os import path
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+sys.path.append(path.dirname(SCRIPT_DIR))
+
+from reader.rss_cache import entry_key
+from reader.rss_dates import date_key
+from reader.rss_model import Entry, entry_to_json
+from reader.rss_stats import stats
+
+__SEARCH_SUFFIX__ = ".search.sqlite3"
+__SQLITE_TIMEOUT__ = 60
+__BATCH_SIZE__ = 10000
+__WORD_PATTERN__ = re.compile(r"\w+\*?")
+
+
+def match_query(text) -> str:
+    """
+    Turn keywords into an FTS5 query which matches entries containing all of them.
+    Every word is quoted, so punctuation and FTS5 operators typed by the user are not a syntax error,
+    and a trailing '*' keeps its prefix meaning ('elect*' matches 'election').
+    :param str text: keywords
+    :return: FTS5 query or an empty string if there are no words
+    """
+    words = []
+    for word in __WORD_PATTERN__.findall(text or ""):
+        prefix = word.endswith("*")
+        words.append(f'"{word.rstrip("*")}"' + ("*" if prefix else ""))
+    return " ".join(words)
+
+
+def signed_key(key):
+    """
+    Convert a 64-bit entry key (see rss_cache.entry_key) into the range of SQLite INTEGER
+    """
+    return key - (1 << 64) if key is not None and key >= 1 << 63 else key
+
+
+class SearchIndex:
+    """
+        A class to represent a full-text and date index over cached news.
+
+        The index is a SQLite database next to the cache (`data/news.search.sqlite3`) with a table of unique
+        entries indexed by (day, rss_source) and a contentless FTS5 inverted index over their titles and
+        summaries, whose rowids are ids of the entries.
+        It is kept up to date incrementally: before every query the entries written to the cache after
+        the last indexed position (see entries_since() of the caches) are added, so the cost of a query
+        doesn't grow with the cache and writers of the cache don't pay for the index. An entry cached again
+        replaces the indexed copy, triggers keep the FTS5 index in step with the table. When the cache is
+        rewritten by pruning, the evicted entries are removed and the next query reads the rewritten
+        cache again, comparing its entries with the indexed ones instead of indexing them again.
+
+        Attributes
+        ----------
+        cache : JsonLinesCache or SqliteCache
+             The indexed cache
+        db_path : str
+             Path to the SQLite database of the index
+
+        Methods
+        -------
+        connect(self):
+            Open the database, creating the schema on the first use
+        update(self):
+            Index the entries written to the cache since the last update
+        search(self, query, date_from, date_to, rss_source, limit):
+            Return cached entries matching keywords and a range of dates
+        latest(self, rss_source, limit):
+            Return the last published cached entries of a source
+        iter_range(self, date_from, date_to, rss_sources):
+            Iterate over cached entries of a range of dates ordered by date and source
+        remove(self, entries):
+            Remove the entries evicted by a rewrite of the cache
+        drop(self):
+            Remove the index
+        """
+
+    def __init__(self, cache):
+        """
+        The initialization method for the SearchIndex instance.
+        :param cache: JsonLinesCache or SqliteCache
+        """
+        self.cache = cache
+        self.db_path = f"{path.splitext(cache.cache_path)[0]}{__SEARCH_SUFFIX__}"
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open the database, creating the schema on the first use
+        :return: sqlite3.Connection in autocommit mode
+        """
+        directory = path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=__SQLITE_TIMEOUT__, isolation_level=None)
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY,
+                key INTEGER UNIQUE,
+                rss_source TEXT,
+                day INTEGER,
+                entry TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_day_source ON entries (day, rss_source);
+            CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+                title, summary, content='', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+                INSERT INTO entries_fts (rowid, title, summary)
+                VALUES (new.id, json_extract(new.entry, '$.title'), json_extract(new.entry, '$.summary'));
+            END;
+            CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+                INSERT INTO entries_fts (entries_fts, rowid, title, summary)
+                VALUES ('delete', old.id, json_extract(old.entry, '$.title'), json_extract(old.entry, '$.summary'));
+            END;
+            CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF entry ON entries BEGIN
+                INSERT INTO entries_fts (entries_fts, rowid, title, summary)
+                VALUES ('delete', old.id, json_extract(old.entry, '$.title'), json_extract(old.entry, '$.summary'));
+                INSERT INTO entries_fts (rowid, title, summary)
+                VALUES (new.id, json_extract(new.entry, '$.title'), json_extract(new.entry, '$.summary'));
+            END;
+        """)
+        return connection
+
+    def update(self) -> int:
+        """
+        Index the entries written to the cache since the last update. An entry which is already indexed
+        (cached again by another fetch) replaces the indexed copy if it has changed, as the last copy is the one
+        kept by pruning. The position and the new rows are committed together, so concurrent updates don't
+        index an entry twice.
+        :return: number of newly indexed entries
+        """
+        if not self.cache.exists():
+            return 0
+        with stats.timer("update_search_index"), closing(self.connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute("SELECT value FROM meta WHERE name = 'position'").fetchone()
+                entries, position = self.cache.entries_since(None if row is None else json.loads(row[0]))
+                last_id = connection.execute("SELECT coalesce(max(id), 0) FROM entries").fetchone()[0]
+                while True:
+                    batch = list(islice(entries, __BATCH_SIZE__))
+                    if not batch:
+                        break
+                    connection.executemany(
+                        "INSERT INTO entries (key, rss_source, day, entry) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET rss_source = excluded.rss_source, day = excluded.day, "
+                        "entry = excluded.entry WHERE entry != excluded.entry",
+                        [self._row(entry) for entry in batch])
+                added = connection.execute("SELECT count(*) FROM entries WHERE id > ?", (last_id,)).fetchone()[0]
+                connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('position', ?)",
+                                   (json.dumps(position),))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        stats.increment("entries_indexed", added)
+        return added
+
+    def search(self, query=None, date_from=None, date_to=None, rss_source=None, limit=None) -> list:
+        """
+        Return cached entries matching keywords and a range of dates.
+        Entries found by keywords are returned from the last cached, entries of a range of dates
+        without keywords are returned by date.
+        :param str query: keywords which all have to be in the title or the summary, or None
+        :param int date_from: first published date in %Y%m%d format or None
+        :param int date_to: last published date in %Y%m%d format or None
+        :param str rss_source: RSS URL or None for all sources
+        :param int limit: maximum number of entries or None for all
+        :return: list of Entry instances
+        """
+        self.update()
+        conditions, parameters = self._conditions(date_from, date_to, None if rss_source is None else [rss_source])
+        if query is not None:
+            expression = match_query(query)
+            if not expression:
+                return []
+            sql = ("SELECT entries.entry FROM entries_fts JOIN entries ON entries.id = entries_fts.rowid "
+                   "WHERE entries_fts MATCH ?")
+            parameters.insert(0, expression)
+            sql += "".join(f" AND {condition}" for condition in conditions)
+            sql += " ORDER BY entries_fts.rowid DESC"
+        else:
+            sql = "SELECT entries.entry FROM entries"
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += " ORDER BY entries.day, entries.id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+
+        with stats.timer("search"), closing(self.connect()) as connection:
+            return [Entry.from_dict(json.loads(row[0])) for row in connection.execute(sql, parameters)]
+
+    def latest(self, rss_source, limit=None) -> list:
+        """
+        Return the last published cached entries of a source, newest days first and in the order they were
+        cached within a day, e.g. to show a feed which is not modified since it was cached
+        :param str rss_source: RSS URL
+        :param int limit: maximum number of entries or None for all
+        :return: list of Entry instances
+        """
+        self.update()
+        sql = "SELECT entry FROM entries WHERE rss_source = ? ORDER BY day DESC, id"
+        parameters = [rss_source]
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+        with closing(self.connect()) as connection:
+            return [Entry.from_dict(json.loads(row[0])) for row in connection.execute(sql, parameters)]
+
+    def iter_range(self, date_from=None, date_to=None, rss_sources=None):
+        """
+        Iterate over cached entries of a range of dates ordered by date and source, reading them from
+        the database one by one (the order of the (day, rss_source) index, so nothing is sorted).
+        Entries without a publish date are skipped.
+        :param int date_from: first published date in %Y%m%d format or None
+        :param int date_to: last published date in %Y%m%d format or None
+        :param list rss_sources: RSS URLs or None for all sources
+        :return: generator of dictionaries with the 'day' field
+        """
+        self.update()
+        conditions, parameters = self._conditions(date_from, date_to, rss_sources)
+        sql = ("SELECT entries.day, entries.entry FROM entries WHERE entries.day IS NOT NULL"
+               + "".join(f" AND {condition}" for condition in conditions)
+               + " ORDER BY entries.day, entries.rss_source, entries.id")
+        with closing(self.connect()) as connection:
+            for day, entry in connection.execute(sql, parameters):
+                entry = json.loads(entry)
+                entry["day"] = day
+                yield entry
+
+    @staticmethod
+    def _conditions(date_from=None, date_to=None, rss_sources=None) -> tuple:
+        conditions, parameters = [], []
+        if date_from is not None:
+            conditions.append("entries.day >= ?")
+            parameters.append(date_from)
+        if date_to is not None:
+            conditions.append("entries.day <= ?")
+            parameters.append(date_to)
+        if rss_sources:
+            conditions.append(f"entries.rss_source IN ({', '.join('?' * len(rss_sources))})")
+            parameters.extend(rss_sources)
+        return conditions, parameters
+
+    def remove(self, entries) -> int:
+        """
+        Remove the entries evicted by a rewrite of the cache. The indexed position doesn't point into
+        the rewritten cache, so the next update reads it from the beginning; its entries are indexed already
+        and are only compared.
+        :param entries: evicted entries
+        :return: number of removed entries
+        """
+        if not path.isfile(self.db_path):
+            return 0
+        with closing(self.connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                entries, removed = iter(entries), 0
+                while True:
+                    batch = list(islice(entries, __BATCH_SIZE__))
+                    if not batch:
+                        break
+                    removed += connection.executemany("DELETE FROM entries WHERE key = ?",
+                                                      [(self._row(dict(entry))[0],) for entry in batch]).rowcount
+                connection.execute("DELETE FROM meta WHERE name = 'position'")
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return removed
+
+    def drop(self):
+        """
+        Remove the index, e.g. when the cache is rewritten
+        """
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            if path.isfile(f"{self.db_path}{suffix}"):
+                os.remove(f"{self.db_path}{suffix}")
+
+    @staticmethod
+    def _row(entry) -> tuple:
+        day = entry.pop("day", None)
+        if day is None:
+            day = date_key(entry.get("date"))
+        text = json.dumps(entry, ensure_ascii=False, default=entry_to_json)
+        key = signed_key(entry_key(entry.get("rss_source"), entry))
+        return key if key is not None else text, entry.get("rss_source"), day, text
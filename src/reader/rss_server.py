@@ -0,0 +1,326 @@
+import argparse
+import json
+import logging
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+from urllib.parse import parse_qs, urlsplit
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+sys.path.append(path.dirname(SCRIPT_DIR))
+
+from reader.rss_cache import LruCache, open_cache
+from reader.rss_entities import RssReader, __JSON_FILE__
+from reader.rss_exeptions import RssReaderApiException
+from reader.rss_fetcher import FeedMemo, fetch_feeds
+from reader.rss_model import dumps_entry
+from reader.rss_search import SearchIndex
+from reader.rss_stats import stats
+from reader.rss_utils import __TRACE_LOGGER__
+
+__HOST__ = "127.0.0.1"
+__PORT__ = 8080
+__RESULT_CACHE_SIZE__ = 256
+__MAX_CACHED_BODY__ = 1024 * 1024
+__CHUNK_SIZE__ = 64 * 1024
+__POLL_INTERVAL__ = 0.05
+
+
+def iter_json(entries, errors=None):
+    """
+    Serialize news as the JSON document {"entries": [...]} piece by piece
+    :param entries: iterable of entries
+    :param list errors: failed sources which are added as the "errors" list, or None
+    :return: generator of bytes
+    """
+    yield b'{"entries": ['
+    separator = b""
+    for entry in entries:
+        yield separator + dumps_entry(entry).encode("utf-8")
+        separator = b", "
+    yield b"]"
+    if errors is not None:
+        yield b', "errors": ' + json.dumps(errors, ensure_ascii=False).encode("utf-8")
+    yield b"}"
+
+
+def int_parameter(parameters, name):
+    value = parameters.get(name, [None])[-1]
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise RssReaderApiException(400, f"'{name}' has to be an integer")
+
+
+class RssServer:
+    """
+        A class to represent a local HTTP/JSON API over the reader and the cache.
+
+        The cache, its search index and the reader stay loaded between requests. Endpoints:
+        GET /news?date=YYYYMMDD&source=URL&limit=N reads cached news of a day (as --date),
+        GET /news?from=YYYYMMDD&to=YYYYMMDD&q=keywords&source=URL&limit=N finds cached news (as --from, --to,
+        --search), POST /fetch?source=URL&source=URL&limit=N fetches feeds, caches their new news and returns
+        the news, and GET /metrics returns rss_stats.stats in the Prometheus text format.
+        Responses are written in chunks while news are serialized. Bodies of /news are kept in an LRU cache
+        together with the version of the news cache (see version() of the caches), so a body is served again
+        only until news are cached, by this server or by another process; /fetch clears it at once.
+
+        Attributes
+        ----------
+        cache : JsonLinesCache or SqliteCache
+             The news cache
+        search_index : SearchIndex
+             The search index of the cache
+        reader : RssReader
+             Reader which caches fetched news
+        results : LruCache
+             Bodies of /news responses by request
+        memo : FeedMemo
+             Normalized entries of fetched feeds by the hash of their body
+        httpd : ThreadingHTTPServer
+             The HTTP server
+
+        Methods
+        -------
+        url(self, path):
+            Return the address of an endpoint
+        news(self, parameters):
+            Return the body of /news
+        fetch(self, parameters):
+            Fetch feeds, cache their new news and return the response body
+        serve_forever(self):
+            Handle requests until interrupted
+        """
+
+    def __init__(self, host=__HOST__, port=__PORT__, cache_backend="json", cache_path=__JSON_FILE__,
+                 result_cache_size=__RESULT_CACHE_SIZE__, timeout=30, verbose=False):
+        """
+        The initialization method for the RssServer instance.
+        :param str host: address to listen on
+        :param int port: port to listen on, 0 for any free port
+        :param cache_backend: 'json' or 'sqlite' cache backend
+        :param cache_path: path to the news cache
+        :param int result_cache_size: number of /news responses kept in memory
+        :param timeout: timeout in seconds for fetching one feed
+        :param verbose: Outputs verbose status messages and logs requests
+        """
+        self.cache_backend = cache_backend
+        self.timeout = timeout
+        self.cache = open_cache(cache_path, cache_backend)
+        self.search_index = SearchIndex(self.cache)
+        self.reader = RssReader(None, None, True, verbose, None, cache_backend)
+        self.reader.cache_path = cache_path
+        self.results = LruCache(result_cache_size, "api_cache")
+        self.memo = FeedMemo(cache_path)
+        self.trace_logger = logging.getLogger(__TRACE_LOGGER__)
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    def url(self, endpoint="/news") -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{endpoint}"
+
+    def news(self, parameters) -> tuple:
+        """
+        Return the body of /news from the LRU cache or from the news cache
+        :param dict parameters: parsed query string
+        :return: (bool whether the body was cached, bytes or generator of bytes)
+        """
+        date = int_parameter(parameters, "date")
+        date_from = int_parameter(parameters, "from")
+        date_to = int_parameter(parameters, "to")
+        limit = int_parameter(parameters, "limit")
+        query = parameters.get("q", [None])[-1]
+        rss_source = parameters.get("source", [None])[-1]
+        if date is None and date_from is None and date_to is None and query is None:
+            raise RssReaderApiException(400, "One of 'date', 'from', 'to' or 'q' is required")
+
+        version = self.cache.version()
+        if version is None:
+            raise RssReaderApiException(404, "The cache does not exist. Please read some news first.")
+        key = (date, date_from, date_to, query, rss_source, limit)
+        cached = self.results.get(key)
+        if cached is not None and cached[0] == version:
+            return True, cached[1]
+
+        with stats.timer("api_news"):
+            if date is not None:
+                entries = self.cache.read_entries(date, rss_source, limit)
+            else:
+                entries = self.search_index.search(query, date_from, date_to, rss_source, limit)
+        return False, self._remember(key, version, iter_json(entries))
+
+    def _remember(self, key, version, chunks):
+        body, size = [], 0
+        for chunk in chunks:
+            size += len(chunk)
+            if size <= __MAX_CACHED_BODY__:
+                body.append(chunk)
+            yield chunk
+        if size <= __MAX_CACHED_BODY__:
+            self.results.put(key, (version, b"".join(body)))
+
+    def fetch(self, parameters):
+        """
+        Fetch feeds, cache their new news and return the response body with the news of every feed
+        (up to `limit`) and the sources which failed
+        :param dict parameters: parsed query string
+        :return: generator of bytes
+        """
+        rss_sources = parameters.get("source", [])
+        if not rss_sources:
+            raise RssReaderApiException(400, "At least one 'source' is required")
+        limit = int_parameter(parameters, "limit")
+
+        entries, errors = [], []
+        with stats.timer("api_fetch"):
+            for rss_source, news_feed in fetch_feeds(rss_sources, timeout=self.timeout, memo=self.memo):
+                status = news_feed.get("status", 200)
+                if status >= 400 or ("bozo_exception" in news_feed and not news_feed.entries):
+                    errors.append({"source": rss_source, "status": status,
+                                   "error": str(news_feed.get("bozo_exception", ""))})
+                    continue
+                rss = RssReader(rss_source, limit, True, self.reader.verbose, None, self.cache_backend, news_feed)
+                rss.memoize(self.memo)
+                rss.check_limit()
+                entries.extend(rss.iter_entries())
+            if entries:
+                self.reader.write_json({"entries": entries})
+                self.results.clear()
+        return iter_json(entries, errors)
+
+    def handle(self, handler, method):
+        """
+        Answer one request of the handler
+        :param BaseHTTPRequestHandler handler: handler of the request
+        :param str method: 'GET' or 'POST'
+        """
+        parts = urlsplit(handler.path)
+        parameters = parse_qs(parts.query)
+        try:
+            if method == "GET" and parts.path == "/news":
+                cached, body = self.news(parameters)
+                self._send(handler, 200, body, cached=cached)
+            elif method == "POST" and parts.path == "/fetch":
+                self._send(handler, 200, self.fetch(parameters))
+            elif method == "GET" and parts.path == "/metrics":
+                self._send(handler, 200, stats.prometheus().encode("utf-8"),
+                           content_type="text/plain; version=0.0.4")
+            else:
+                raise RssReaderApiException(404, f"Unknown endpoint: {method} {parts.path}")
+        except RssReaderApiException as exc:
+            self._send_error(handler, exc.status, str(exc))
+        except Exception as exc:
+            stats.increment("errors")
+            self._send_error(handler, 500, str(exc).strip())
+
+    def _send_error(self, handler, status, message):
+        self._send(handler, status, json.dumps({"error": message}, ensure_ascii=False).encode("utf-8"))
+
+    def _send(self, handler, status, body, content_type="application/json; charset=utf-8", cached=False):
+        """
+        Send the response. Once the headers are sent, a failure (e.g. of serializing news or a client which
+        has gone away) can't be answered with another response: it is logged and the connection is closed,
+        so the client sees a body cut short instead of the terminating chunk.
+        """
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("X-Cache", "hit" if cached else "miss")
+        if isinstance(body, bytes):
+            handler.send_header("Content-Length", str(len(body)))
+        else:
+            handler.send_header("Transfer-Encoding", "chunked")
+        try:
+            handler.end_headers()
+            if isinstance(body, bytes):
+                handler.wfile.write(body)
+                return
+            buffer, size = [], 0
+            for chunk in body:
+                buffer.append(chunk)
+                size += len(chunk)
+                if size >= __CHUNK_SIZE__:
+                    self._write_chunk(handler, b"".join(buffer))
+                    buffer, size = [], 0
+            if buffer:
+                self._write_chunk(handler, b"".join(buffer))
+            handler.wfile.write(b"0\r\n\r\n")
+        except Exception as exc:
+            stats.increment("errors")
+            handler.close_connection = True
+            self.reader.logger_obj.error(f"The response to {handler.command} {handler.path} is aborted: {exc}")
+
+    @staticmethod
+    def _write_chunk(handler, data):
+        handler.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server.handle(self, "GET")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                server.handle(self, "POST")
+
+            def log_message(self, format, *args):
+                server.trace_logger.debug(f"{self.address_string()} {format % args}")
+
+        return Handler
+
+    def serve_forever(self):
+        """
+        Handle requests until interrupted
+        """
+        self.reader.logger_obj.info(f"Serving on {self.url('/')}")
+        self.httpd.serve_forever()
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(__POLL_INTERVAL__,), daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+
+def main():
+    """
+    Run the HTTP/JSON API server until interrupted
+    """
+    parser = argparse.ArgumentParser(description="HTTP/JSON API over the RSS reader and its cache.")
+    parser.add_argument("--host", help="Address to listen on", default=__HOST__)
+    parser.add_argument("--port", help="Port to listen on", type=int, default=__PORT__)
+    parser.add_argument("--cache-backend", help="Cache backend for storing and reading news",
+                        choices=["json", "sqlite"], default="json")
+    parser.add_argument("--result-cache-size", help="Number of /news responses kept in memory", type=int,
+                        default=__RESULT_CACHE_SIZE__)
+    parser.add_argument("--timeout", help="Timeout in seconds for fetching one feed", type=float, default=30)
+    parser.add_argument("--verbose", help="Outputs verbose status messages and logs requests", action="store_true")
+    args = parser.parse_args()
+
+    server = RssServer(args.host, args.port, args.cache_backend, __JSON_FILE__, args.result_cache_size,
+                       args.timeout, args.verbose)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.reader.logger_obj.info("The server is stopped")
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
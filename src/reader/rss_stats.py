@@ -0,0 +1,191 @@
+import functools
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from os import path
+
+SCRIPT_DIR = path.dirname(path.abspath(__file__))
+sys.path.append(path.dirname(SCRIPT_DIR))
+
+__SUMMARY_LENGTH__ = 80
+__METRIC_PREFIX__ = "rss_reader"
+
+
+def summarize(value, length=__SUMMARY_LENGTH__) -> str:
+    """
+    Return a short description of an argument or a result for the log.
+    Containers are described by their type and size without looking at their items, so summarizing
+    the dictionary of a whole feed costs as little as summarizing a number.
+    :param value: any object
+    :param int length: maximum length of the description
+    :return: description
+    """
+    if isinstance(value, dict) and isinstance(value.get("entries"), (list, tuple)):
+        return f"<dict with {len(value['entries'])} entries>"
+    if isinstance(value, (dict, list, tuple, set, frozenset)):
+        return f"<{type(value).__name__} of {len(value)} items>"
+    if isinstance(value, (str, bytes)) and len(value) > length:
+        value = value[:length]
+    description = repr(value)
+    return description if len(description) <= length else f"{description[:length - 3]}..."
+
+
+def summarize_arguments(args, kwargs, length=__SUMMARY_LENGTH__) -> str:
+    """
+    Return short descriptions of positional and keyword arguments joined with commas
+    """
+    return ", ".join([summarize(value, length) for value in args] +
+                     [f"{key}={summarize(value, length)}" for key, value in kwargs.items()])
+
+
+class Stats:
+    """
+        A class to represent counters and timings of the rss-reader collected during one run.
+
+        Stages are timed with timer() or the timed() decorator, the latency of HTTP requests is recorded
+        by host with record_host(), counters (entries parsed, bytes fetched) are increased with increment()
+        and gauges (cache size) are set with set_gauge(). Updates take a lock, so feeds fetched in threads
+        may count their bytes. The collected data is printed with
+        report() or dumped in the Prometheus text format with prometheus().
+
+        Attributes
+        ----------
+        counters : dict
+             Counters by name
+        gauges : dict
+             Last values by name
+        timings: dict
+             [calls, total seconds, max seconds] by stage
+        hosts: dict
+             [requests, total seconds, max seconds] by host
+
+        Methods
+        -------
+        increment(self, name, value):
+            Increase the counter
+        set_gauge(self, name, value):
+            Set the gauge
+        record(self, stage, seconds):
+            Add one call of the stage
+        record_host(self, host, seconds):
+            Add the latency of one request to the host
+        timer(self, stage):
+            Context manager which records the time of the block
+        timed(self, stage):
+            Decorator which records the time of every call of the function
+        report(self):
+            Return the statistics in human readable format
+        prometheus(self, prefix):
+            Return the statistics in the Prometheus text format
+        """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all collected data
+        """
+        with self.lock:
+            self.counters = {}
+            self.gauges = {}
+            self.timings = {}
+            self.hosts = {}
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def record(self, stage, seconds):
+        with self.lock:
+            timing = self.timings.setdefault(stage, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def record_host(self, host, seconds):
+        with self.lock:
+            timing = self.hosts.setdefault(host, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def timed(self, stage=None):
+        """
+        Decorator which records the time of every call of the function
+        :param str stage: name of the stage, the name of the function by default
+        :return: decorator
+        """
+        def decorator(func):
+            name = stage or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def report(self) -> str:
+        """
+        Return the statistics in human readable format
+        :return: text
+        """
+        with self.lock:
+            lines = ["Stage                   calls    total, s      max, s"]
+            lines += [f"{stage:<20} {calls:>8} {total:>11.4f} {longest:>11.4f}"
+                      for stage, (calls, total, longest) in sorted(self.timings.items())]
+            if self.hosts:
+                lines.append("Host                 requests    total, s      max, s")
+                lines += [f"{host:<20} {requests:>8} {total:>11.4f} {longest:>11.4f}"
+                          for host, (requests, total, longest) in sorted(self.hosts.items())]
+            lines += [f"{name}: {value}" for name, value in sorted({**self.counters, **self.gauges}.items())]
+        return "\n".join(lines)
+
+    def prometheus(self, prefix=__METRIC_PREFIX__) -> str:
+        """
+        Return the statistics in the Prometheus text format
+        :param str prefix: prefix of metric names
+        :return: text
+        """
+        with self.lock:
+            lines = [f"# TYPE {prefix}_stage_calls_total counter"]
+            lines += [f'{prefix}_stage_calls_total{{stage="{stage}"}} {calls}'
+                      for stage, (calls, _, _) in sorted(self.timings.items())]
+            lines.append(f"# TYPE {prefix}_stage_seconds_total counter")
+            lines += [f'{prefix}_stage_seconds_total{{stage="{stage}"}} {total:.6f}'
+                      for stage, (_, total, _) in sorted(self.timings.items())]
+            lines.append(f"# TYPE {prefix}_stage_max_seconds gauge")
+            lines += [f'{prefix}_stage_max_seconds{{stage="{stage}"}} {longest:.6f}'
+                      for stage, (_, _, longest) in sorted(self.timings.items())]
+            lines.append(f"# TYPE {prefix}_host_requests_total counter")
+            lines += [f'{prefix}_host_requests_total{{host="{host}"}} {requests}'
+                      for host, (requests, _, _) in sorted(self.hosts.items())]
+            lines.append(f"# TYPE {prefix}_host_latency_seconds_total counter")
+            lines += [f'{prefix}_host_latency_seconds_total{{host="{host}"}} {total:.6f}'
+                      for host, (_, total, _) in sorted(self.hosts.items())]
+            lines.append(f"# TYPE {prefix}_host_max_latency_seconds gauge")
+            lines += [f'{prefix}_host_max_latency_seconds{{host="{host}"}} {longest:.6f}'
+                      for host, (_, _, longest) in sorted(self.hosts.items())]
+            for name, value in sorted(self.counters.items()):
+                lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+            for name, value in sorted(self.gauges.items()):
+                lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+stats = Stats()
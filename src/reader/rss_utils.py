@@ -3,14 +3,24 @@ import argparse
 import functools
 import sys
 import os
-from fpdf import FPDF
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from string import Formatter
 
 from reader.rss_exeptions import RssReaderException, RssReaderHtmlException, RssReaderPdfException, RssReaderCacheException
+from reader.rss_model import dumps_entry
+from reader.rss_stats import stats, summarize, summarize_arguments
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
 __JSON_FILE__ = "data/news.json"
+__HTML_BUFFER_SIZE__ = 1024 * 1024
+__PDF_FONT__ = "data/DejaVuSerif-Bold.ttf"
+__PDF_BATCH_SIZE__ = 100
+__TRACE_LOGGER__ = "reader.trace"
+__JSON_FLUSH_SIZE__ = 100
+__DIAGNOSTICS__ = {"stderr": False}
 
 
 def parse_argument():
@@ -24,13 +34,47 @@ def parse_argument():
                         help="News published date from cashes if this parameter provided",
                         type=int)
 
-    nargs_source_value = "?" if ("--date" in sys.argv) else 1
+    parser.add_argument("--from",
+                        help="First published date (%%Y%%m%%d) of cached news to read",
+                        dest="date_from",
+                        type=int)
+
+    parser.add_argument("--to",
+                        help="Last published date (%%Y%%m%%d) of cached news to read",
+                        dest="date_to",
+                        type=int)
+
+    parser.add_argument("--search",
+                        help="Find cached news with all of these keywords in the title or summary",
+                        type=str)
+
+    commands_without_source = {"--date", "--from", "--to", "--search", "--sources-file", "--compact-cache",
+                               "--rebuild-index", "--prune-cache", "--export-dir"}
+    nargs_source_value = "*" if commands_without_source & set(sys.argv) else "+"
 
     parser.add_argument("source",
-                        help="RSS URL",
+                        help="RSS URL (several URLs are fetched concurrently)",
                         type=str,
                         nargs=nargs_source_value)
 
+    parser.add_argument("--sources-file",
+                        help="File with RSS URLs, one per line",
+                        type=str)
+
+    parser.add_argument("--workers",
+                        help="Maximum number of feeds fetched at the same time",
+                        type=int,
+                        default=16)
+
+    parser.add_argument("--parse-workers",
+                        help="Number of processes parsing a large feed (over 1 MiB) in chunks",
+                        type=int)
+
+    parser.add_argument("--timeout",
+                        help="Timeout in seconds for fetching one feed (connecting and downloading it)",
+                        type=float,
+                        default=30)
+
     parser.add_argument("--version",
                         action="version",
                         version="Version 1.4",
@@ -40,6 +84,11 @@ def parse_argument():
                         help="Print result as JSON in stdout",
                         action="store_true")
 
+    parser.add_argument("--format",
+                        help="Output format: human readable text, one JSON document or one JSON object per line "
+                             "(--json means --format json)",
+                        choices=["text", "json", "ndjson"])
+
     parser.add_argument("--verbose",
                         help="Outputs verbose status messages",
                         action="store_true")
@@ -56,30 +105,162 @@ def parse_argument():
                         help="Pass to output pdf file",
                         type=str)
 
+    parser.add_argument("--pdf-split",
+                        help="Split pdf file into parts of this number of news written in parallel",
+                        type=int)
+
+    parser.add_argument("--cache-backend",
+                        help="Cache backend for storing and reading news",
+                        choices=["json", "sqlite"],
+                        default="json")
+
+    parser.add_argument("--compact-cache",
+                        help="Compact the json cache into Parquet files partitioned by date and source (needs pyarrow)",
+                        action="store_true")
+
+    parser.add_argument("--rebuild-index",
+                        help="Build the offset index of the json cache again",
+                        action="store_true")
+
+    parser.add_argument("--prune-cache",
+                        help="Deduplicate the cache, drop news by the retention policy and rewrite it",
+                        action="store_true")
+
+    parser.add_argument("--keep-days",
+                        help="Retention policy: keep news of this number of last days (it is saved for the cache)",
+                        type=int)
+
+    parser.add_argument("--keep-per-source",
+                        help="Retention policy: keep this number of newest news of every source (it is saved)",
+                        type=int)
+
+    parser.add_argument("--max-cache-size",
+                        help="Retention policy: keep the newest news which fit into this number of bytes (it is saved)",
+                        type=int)
+
+    parser.add_argument("--export-dir",
+                        help="Export cached news (of the sources and --from/--to range) to one file per source "
+                             "and day or week in this directory",
+                        type=str)
+
+    parser.add_argument("--export-by",
+                        help="Period of one exported file",
+                        choices=["day", "week"],
+                        default="day")
+
+    parser.add_argument("--export-format",
+                        help="Format of exported files, it can be given twice for both (html by default)",
+                        choices=["html", "pdf"],
+                        action="append")
+
+    parser.add_argument("--export-workers",
+                        help="Number of processes writing exported files, the number of CPUs by default",
+                        type=int)
+
+    parser.add_argument("--new-only",
+                        help="Display only news which are not cached yet",
+                        action="store_true")
+
+    parser.add_argument("--daemon",
+                        help="Keep running and poll every feed on its own schedule, caching only new news",
+                        action="store_true")
+
+    parser.add_argument("--interval",
+                        help="Default poll interval in seconds for the daemon mode",
+                        type=int,
+                        default=900)
+
+    parser.add_argument("--stats",
+                        help="Print timings of stages and counters to stderr at the end, "
+                             "as a table or in the Prometheus text format",
+                        choices=["text", "prometheus"],
+                        nargs="?",
+                        const="text")
+
     return parser.parse_args()
 
 
+def read_sources_file(sources_path, with_intervals=False) -> list:
+    """
+    Read RSS URLs from a file, one per line. Empty lines and lines starting with '#' are skipped.
+    A URL may be followed by its poll interval in seconds for the daemon mode: 'https://example.com/rss 600'.
+    :param sources_path: path to the file or None
+    :param with_intervals: return (RSS URL, interval or None) instead of RSS URLs
+    :return: list of RSS URLs
+    """
+    if sources_path is None:
+        return []
+    try:
+        with open(sources_path, "r", encoding="utf-8") as infile:
+            lines = [line.split() for line in infile if line.strip() and not line.lstrip().startswith("#")]
+    except OSError as exc:
+        raise RssReaderException(f"Unable to read the sources file: {exc}")
+    if not with_intervals:
+        return [line[0] for line in lines]
+    try:
+        return [(line[0], int(line[1]) if len(line) > 1 else None) for line in lines]
+    except ValueError as exc:
+        raise RssReaderException(f"Invalid poll interval in the sources file: {exc}")
+
+
 def get_logger(verbose: bool = True) -> logging.Logger:
     """
-    Create a logger with stdout logging or in a file and returns Logger object
-    :param verbose: if true then stdout logging
+    Create a logger with stdout logging or in a file and returns Logger object.
+    A handler is added only once, so readers created one after another share it.
+    :param verbose: if true then stdout logging and tracing of method calls
     :return: Logger instance
     """
     logger = logging.getLogger()
     formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(funcName)s - %(message)s")
 
-    handler = logging.FileHandler("logfile.log")
-    if verbose:
-        handler = logging.StreamHandler()
-
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    handler_class = logging.StreamHandler if verbose else logging.FileHandler
+    if not any(type(existing) is handler_class for existing in logger.handlers):
+        handler = logging.StreamHandler() if verbose else logging.FileHandler("logfile.log")
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
     logger.setLevel(logging.INFO)
+    logging.getLogger(__TRACE_LOGGER__).setLevel(logging.DEBUG if verbose else logging.INFO)
     logger.info("The rss-reading starts working")
 
     return logger
 
 
+def send_diagnostics_to_stderr(enabled=True):
+    """
+    Print diagnostic messages (errors and suppressed exceptions) to stderr instead of stdout,
+    so that the json or ndjson output on stdout stays parseable
+    :param bool enabled: False to print them to stdout again
+    """
+    __DIAGNOSTICS__["stderr"] = enabled
+
+
+def print_diagnostic(message):
+    """
+    Print a diagnostic message to stdout, or to stderr (see send_diagnostics_to_stderr)
+    :param str message: the message
+    """
+    print(message, file=sys.stderr if __DIAGNOSTICS__["stderr"] else sys.stdout)
+
+
+def report_suppressed_exception(exc):
+    """
+    Print the message about the suppressed exception
+    :param exc: exception of the rss-reader
+    """
+    if isinstance(exc, RssReaderCacheException):
+        print_diagnostic("Please, check the file existence and start over. \n"
+                         "The following exception was suppressed: " + exc.__str__())
+    elif isinstance(exc, RssReaderHtmlException):
+        print_diagnostic("Please, check the entered path to html and start over. \n"
+                         "The following exception was suppressed: " + exc.__str__())
+    elif isinstance(exc, RssReaderPdfException):
+        print_diagnostic("Please, check the entered path to pdf and start over. \n"
+                         "The following exception was suppressed: " + exc.__str__())
+    else:
+        print_diagnostic("Please, check the entered parameters and start over. \n"
+                         "The following exception was suppressed: " + exc.__str__())
+
+
 def exceptions_suppressing_decorator(func):
     """
     This is a decorator that suppresses errors if they occur during the method
@@ -91,29 +272,38 @@ def exceptions_suppressing_decorator(func):
         try:
             result = func(*args, **kwargs)
             return result
-        except RssReaderException as exc:
-            print("Please, check the entered parameters and start over. \n"
-                  "The following exception was suppressed: " + exc.__str__())
-            return None
-        except RssReaderCacheException as exc:
-            print("Please, check the file existence and start over. \n"
-                  "The following exception was suppressed: " + exc.__str__())
-            return None
-        except RssReaderHtmlException as exc:
-            print("Please, check the entered path to html and start over. \n"
-                  "The following exception was suppressed: " + exc.__str__())
-            return None
-        except RssReaderPdfException as exc:
-            print("Please, check the entered path to pdf and start over. \n"
-                  "The following exception was suppressed: " + exc.__str__())
+        except (RssReaderException, RssReaderCacheException, RssReaderHtmlException, RssReaderPdfException) as exc:
+            report_suppressed_exception(exc)
             return None
     return wrapper
 
 
+def exceptions_wrapping_decorator(exception_class, message):
+    """
+    This is a decorator that prints the message and re-raises any error of the method as exception_class
+    :param exception_class: exception of the rss-reader
+    :param message: message printed when an error occurs
+    :return: decorator
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except exception_class:
+                raise
+            except Exception as exc:
+                print_diagnostic(message)
+                raise exception_class(exc.__str__())
+        return wrapper
+    return decorator
+
+
 def log_decorator(_func=None):
     """
-    It is a log decorator for outputting to the log information about begin and end of the method,
-    as well as the incoming parameters and the returned result.
+    It is a log decorator for timing the method and outputting to the log information about begin and end
+    of the method. The incoming parameters and the returned result are summarized (see rss_stats.summarize)
+    and only if the trace logger is enabled (--verbose), so the decorator costs little otherwise.
     :param _func: specific method
     :return: log_decorator_wrapper
     """
@@ -121,18 +311,24 @@ def log_decorator(_func=None):
         @functools.wraps(func)
         def log_decorator_wrapper(self, *args, **kwargs):
             logger_obj = self.logger_obj
-            args_passed_in_function = [repr(a) for a in args]
-            kwargs_passed_in_function = [f"{k}={v!r}" for k, v in kwargs.items()]
-            formatted_arguments = ", ".join(args_passed_in_function + kwargs_passed_in_function)
-            logger_obj.info(f"Begin function {func.__name__}() - Arguments: {str(formatted_arguments).encode('cp850', errors='replace')}")
+            trace_logger = logging.getLogger(__TRACE_LOGGER__)
+            tracing = trace_logger.isEnabledFor(logging.DEBUG)
+            if tracing:
+                trace_logger.debug(f"Begin function {func.__name__}() - Arguments: {summarize_arguments(args, kwargs)}")
+            start = time.perf_counter()
             try:
                 result = func(self, *args, **kwargs)
-                logger_obj.info(f"End function {func.__name__}() - Returned: {str(result).encode('cp850', errors='replace')!r}")
+                if tracing:
+                    trace_logger.debug(f"End function {func.__name__}() - Returned: {summarize(result)} "
+                                       f"in {time.perf_counter() - start:.4f} s")
                 return result
             except Exception as exc:
+                stats.increment("errors")
                 logger_obj.error(f"Exception: {exc.__str__()}")
-                print("Something went wrong...")
+                print_diagnostic("Something went wrong...")
                 raise RssReaderException(exc.__str__())
+            finally:
+                stats.record(func.__name__, time.perf_counter() - start)
 
         return log_decorator_wrapper
 
@@ -142,71 +338,482 @@ def log_decorator(_func=None):
         return log_decorator_info(_func)
 
 
-@exceptions_suppressing_decorator
-def pass_to_html(html_path, rss_json):
-    """
-    Convert rss-news to html file
-    :param html_path: path to html file
-    :param rss_json: data with rss news in json format
+class HtmlTemplate:
     """
-    try:
-        with open(html_path, "w", encoding="utf-8") as outfile:
-            html_template = """<html>
+        A class to represent a html template which is parsed once into pieces.
+
+        The template is split with string.Formatter when it is created, so rendering an entry only formats
+        the values of the fields and joins the pieces. Conversions and format specs ('{title!r}', '{index:>3}')
+        work as in str.format, and field names don't have to be Python identifiers. Unknown keyword arguments
+        are ignored, so a dictionary with extra keys can be passed as **kwargs.
+
+        Attributes
+        ----------
+        pieces : tuple
+             (literal text, field name or None, format spec, conversion or None) of the template
+        fields : tuple
+             Names of the fields of the template
+
+        Methods
+        -------
+        render(self, **values):
+            Return the template filled with values
+        """
+
+    formatter = Formatter()
+
+    def __init__(self, template):
+        """
+        The initialization method for the HtmlTemplate instance.
+        :param template: template with '{field}' placeholders in the str.format syntax
+        """
+        self.pieces = tuple(self.formatter.parse(template))
+        fields = [field for _, field, _, _ in self.pieces if field is not None]
+        if "" in fields or any(field.isdigit() for field in fields):
+            raise ValueError(f"Template fields have to be named: {template!r}")
+        self.fields = tuple(dict.fromkeys(fields))
+
+    def render(self, **values) -> str:
+        """
+        Return the template filled with values
+        :param values: values of the fields
+        :return: str
+        """
+        parts = []
+        for literal, field, spec, conversion in self.pieces:
+            parts.append(literal)
+            if field is not None:
+                value = values[field]
+                if conversion is not None:
+                    value = self.formatter.convert_field(value, conversion)
+                parts.append(format(value, spec))
+        return "".join(parts)
+
+
+HTML_HEAD = """<html>
           <head>
           <title>RSS-reader</title>
           <meta charset="utf-8">
           </head>
           <body>
           """
-
-            for entry in rss_json['entries']:
-                keys_entry = entry.keys()
-                html_template += f"<h1>{entry['feed']}</h1>"
-                html_template += f"<h2>{entry['title']}</h2>"
-                html_template += f"<p>{entry['date']}</p>"
-                for link in entry['links']:
-                    if link['type'] == 'image/jpeg':
-                        html_template += f"<img src='{link['href']}'/>"
-
-                if "summary" in keys_entry:
-                    html_template += f"<p>{entry['summary']}</p>"
-                html_template += f"<a href='{entry['link']}'>More details ...</a>"
-
-            html_template += """
+HTML_ENTRY = HtmlTemplate("<h1>{feed}</h1><h2>{title}</h2><p>{date}</p>{images}{summary}"
+                          "<a href='{link}'>More details ...</a>")
+HTML_IMAGE = HtmlTemplate("<img src='{href}'/>")
+HTML_SUMMARY = HtmlTemplate("<p>{summary}</p>")
+HTML_TAIL = """
           </body>
           </html>
           """
-            outfile.write(html_template)
-    except Exception as exc:
-        print(f"\nError: Unable to write html-file.")
-        raise RssReaderHtmlException(exc.__str__())
+
+
+class HtmlWriter:
+    """
+        A class to represent a html file the rss-news are written to one by one.
+
+        Every entry is rendered with the precompiled HTML_ENTRY template and written straight into
+        a buffered file, so memory does not grow with the number of entries.
+
+        Methods
+        -------
+        write_entry(self, entry):
+            Write one entry to the file
+        close(self):
+            Write the end of the document and close the file
+        """
+
+    @exceptions_wrapping_decorator(RssReaderHtmlException, "\nError: Unable to write html-file.")
+    def __init__(self, html_path):
+        """
+        The initialization method for the HtmlWriter instance. Opens the file and writes the head of the document.
+        :param html_path: path to html file
+        """
+        self.outfile = open(html_path, "w", encoding="utf-8", buffering=__HTML_BUFFER_SIZE__)
+        self.outfile.write(HTML_HEAD)
+
+    @exceptions_wrapping_decorator(RssReaderHtmlException, "\nError: Unable to write html-file.")
+    def write_entry(self, entry):
+        """
+        Write one entry to the file
+        :param entry: Entry or dictionary with entry contents
+        """
+        images = "".join(HTML_IMAGE.render(**link) for link in entry['links'] if link['type'] == 'image/jpeg')
+        summary = HTML_SUMMARY.render(summary=entry['summary']) if "summary" in entry.keys() else ""
+        self.outfile.write(HTML_ENTRY.render(feed=entry['feed'], title=entry['title'], date=entry['date'],
+                                             images=images, summary=summary, link=entry['link']))
+
+    @exceptions_wrapping_decorator(RssReaderHtmlException, "\nError: Unable to write html-file.")
+    def close(self):
+        """
+        Write the end of the document and close the file
+        """
+        with self.outfile:
+            self.outfile.write(HTML_TAIL)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PdfWriter:
+    """
+        A class to represent a pdf file the rss-news are written to one by one.
+
+        Entries are collected in batches and laid out by the writer itself: lines are wrapped in one pass
+        with cached character widths and put on the page with FPDF.text(), which is much cheaper than
+        the line breaking of FPDF.write() for every field.
+
+        Methods
+        -------
+        write_entry(self, entry):
+            Add one entry to the batch
+        flush(self):
+            Lay out the batch of entries
+        close(self):
+            Write the document to the file
+        """
+
+    @exceptions_wrapping_decorator(RssReaderPdfException, "\nError: Unable to write pdf-file.")
+    def __init__(self, pdf_path, batch_size=__PDF_BATCH_SIZE__):
+        """
+        The initialization method for the PdfWriter instance.
+        :param pdf_path: path to pdf file
+        :param batch_size: number of entries laid out at once
+        """
+        from fpdf import FPDF
+
+        self.pdf_path = pdf_path
+        self.batch_size = batch_size
+        self.batch = []
+        self.pdf = FPDF()
+        self.pdf.add_page()
+        # Every document parses the font again: deep copies of an FPDF share the parsed TTFont,
+        # and fpdf subsets it in place on output, so a per-process template would break the next document.
+        self.pdf.add_font('DejaVu', fname=__PDF_FONT__)
+        self.pdf.set_font('DejaVu', size=14)
+        self.line_height = self.pdf.font_size
+        self.baseline = 0.8 * self.pdf.font_size
+        self.char_widths = {}
+
+    @exceptions_wrapping_decorator(RssReaderPdfException, "\nError: Unable to write pdf-file.")
+    def write_entry(self, entry):
+        """
+        Add one entry to the batch
+        :param entry: Entry or dictionary with entry contents
+        """
+        self.batch.append(entry)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    @exceptions_wrapping_decorator(RssReaderPdfException, "\nError: Unable to write pdf-file.")
+    def flush(self):
+        """
+        Lay out the batch of entries
+        """
+        for entry in self.batch:
+            keys_entry = entry.keys()
+            self._paragraph(f"Feed: {entry['feed']}")
+            self._paragraph(f"Title: {entry['title']}")
+            self._paragraph(f"Date: {entry['date']}")
+            if "summary" in keys_entry:
+                self._paragraph(f"Summary: {entry['summary']}")
+            self._line("")
+            self._button("See more details ...", f"{entry['link']}")
+            self._line("")
+            self._line("")
+            self._line("--------------------------")
+        self.batch = []
+
+    @exceptions_wrapping_decorator(RssReaderPdfException, "\nError: Unable to write pdf-file.")
+    def close(self):
+        """
+        Write the document to the file
+        """
+        self.flush()
+        self.pdf.output(self.pdf_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _width(self, text) -> float:
+        char_widths = self.char_widths
+        width = 0
+        for char in text:
+            char_width = char_widths.get(char)
+            if char_width is None:
+                char_width = char_widths[char] = self.pdf.get_string_width(char)
+            width += char_width
+        return width
+
+    def _wrap(self, text):
+        max_width = self.pdf.epw
+        space_width = self._width(" ")
+        for paragraph in text.split("\n"):
+            line, line_width = [], 0
+            for word in paragraph.split(" "):
+                word_width = self._width(word)
+                while word_width > max_width:
+                    if line:
+                        yield " ".join(line)
+                        line, line_width = [], 0
+                    cut = len(word) - 1
+                    while cut > 1 and self._width(word[:cut]) > max_width:
+                        cut -= 1
+                    yield word[:cut]
+                    word = word[cut:]
+                    word_width = self._width(word)
+                if line and line_width + space_width + word_width > max_width:
+                    yield " ".join(line)
+                    line, line_width = [], 0
+                line_width += (space_width if line else 0) + word_width
+                line.append(word)
+            yield " ".join(line)
+
+    def _line(self, text):
+        pdf = self.pdf
+        if pdf.y + self.line_height > pdf.page_break_trigger:
+            pdf.add_page()
+        if text:
+            pdf.text(pdf.l_margin, pdf.y + self.baseline, text)
+        pdf.y += self.line_height
+
+    def _paragraph(self, text):
+        self._line("")
+        for line in self._wrap(text):
+            self._line(line)
+
+    def _button(self, text, link):
+        pdf = self.pdf
+        if pdf.y + self.line_height > pdf.page_break_trigger:
+            pdf.add_page()
+        width = self._width(text) + 2 * pdf.c_margin
+        pdf.rect(pdf.l_margin, pdf.y, width, self.line_height)
+        pdf.text(pdf.l_margin + pdf.c_margin, pdf.y + self.baseline, text)
+        pdf.link(pdf.l_margin, pdf.y, width, self.line_height, link)
+        pdf.y += self.line_height
+
+
+def write_pdf_part(pdf_path, entries):
+    """
+    Write entries to one pdf file, it is run in the worker processes of SplitPdfWriter
+    :param pdf_path: path to pdf file
+    :param entries: list of entries
+    :return: pdf_path
+    """
+    with PdfWriter(pdf_path) as writer:
+        for entry in entries:
+            writer.write_entry(entry)
+    return pdf_path
+
+
+class SplitPdfWriter:
+    """
+        A class to represent a huge pdf export which is split into several files written in parallel.
+
+        Every `split_size` entries are sent to a pool of worker processes and written to a separate file:
+        'news.pdf' becomes 'news-001.pdf', 'news-002.pdf', ...
+        At most two parts per worker are waiting, so memory is bounded.
+
+        Methods
+        -------
+        write_entry(self, entry):
+            Add one entry to the current part
+        close(self):
+            Send the last part and wait for all files
+        """
+
+    @exceptions_wrapping_decorator(RssReaderPdfException, "\nError: Unable to write pdf-file.")
+    def __init__(self, pdf_path, split_size, workers=None):
+        """
+        The initialization method for the SplitPdfWriter instance.
+        :param pdf_path: path to pdf file, the number of the part is added to the name
+        :param split_size: number of entries in one file
+        :param workers: number of worker processes, the number of CPUs by default
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.pdf_path = pdf_path
+        self.split_size = split_size
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.futures = set()
+        self.part_paths = []
+        self.batch = []
+
+    @exceptions_wrapping_decorator(RssReaderPdfException, "\nError: Unable to write pdf-file.")
+    def write_entry(self, entry):
+        """
+        Add one entry to the current part
+        :param entry: Entry or dictionary with entry contents
+        """
+        self.batch.append(entry)
+        if len(self.batch) >= self.split_size:
+            self._submit()
+
+    @exceptions_wrapping_decorator(RssReaderPdfException, "\nError: Unable to write pdf-file.")
+    def close(self):
+        """
+        Send the last part and wait for all files
+        """
+        try:
+            if self.batch or not self.part_paths:
+                self._submit()
+            for future in self.futures:
+                future.result()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _submit(self):
+        if len(self.futures) >= 2 * self.workers:
+            done, self.futures = wait(self.futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        root, extension = os.path.splitext(self.pdf_path)
+        part_path = f"{root}-{len(self.part_paths) + 1:03d}{extension}"
+        self.futures.add(self.executor.submit(write_pdf_part, part_path, self.batch))
+        self.part_paths.append(part_path)
+        self.batch = []
+
+
+class JsonStreamWriter:
+    """
+        A class to represent the JSON output of the rss-news, which are serialized one by one.
+
+        With the 'json' format the output is one document {"entries": [...]} whose parts are written as entries
+        come, with 'ndjson' every entry is one line of JSON. The output goes through the buffer of the file
+        (stdout by default) and is flushed every `flush_size` entries and at the end, so a consumer reading
+        a pipe (jq, a log shipper) gets the news while they are produced and memory does not grow with
+        the number of entries. If the consumer goes away (e.g. `| head`), the output is switched off and
+        the other outputs of the stream go on.
+
+        Methods
+        -------
+        write_entry(self, entry):
+            Write one entry
+        close(self):
+            Write the end of the document and flush the output
+        """
+
+    def __init__(self, output_format="json", outfile=None, flush_size=__JSON_FLUSH_SIZE__):
+        """
+        The initialization method for the JsonStreamWriter instance.
+        :param str output_format: 'json' or 'ndjson'
+        :param outfile: text file, sys.stdout by default
+        :param int flush_size: number of entries between flushes
+        """
+        self.output_format = output_format
+        self.outfile = sys.stdout if outfile is None else outfile
+        self.flush_size = flush_size
+        self.number = 0
+        if output_format == "json":
+            self._write('{"entries": [')
+
+    def write_entry(self, entry):
+        """
+        Write one entry
+        :param entry: Entry or dictionary with entry contents
+        """
+        if self.output_format == "ndjson":
+            self._write(f"{dumps_entry(entry)}\n", self.number % self.flush_size == self.flush_size - 1)
+        else:
+            self._write(f"{', ' if self.number else ''}{dumps_entry(entry)}",
+                        self.number % self.flush_size == self.flush_size - 1)
+        self.number += 1
+
+    def close(self):
+        """
+        Write the end of the document and flush the output
+        """
+        self._write("]}\n" if self.output_format == "json" else "", flush=True)
+
+    def _write(self, text, flush=False):
+        if self.outfile is None:
+            return
+        try:
+            self.outfile.write(text)
+            if flush:
+                self.outfile.flush()
+        except BrokenPipeError:
+            if self.outfile is sys.stdout:
+                # nothing is written to the closed pipe at exit either
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            self.outfile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SuppressingSink:
+    """
+        A class to represent an output (HtmlWriter or PdfWriter) whose errors are suppressed.
+
+        The first error is reported like in exceptions_suppressing_decorator and the output is switched off,
+        so the other outputs of the stream go on.
+        """
+
+    def __init__(self, writer_class, *args):
+        self.writer = None
+        self.writer = self._call(writer_class, *args)
+
+    def _call(self, func, *args):
+        try:
+            return func(*args)
+        except (RssReaderHtmlException, RssReaderPdfException) as exc:
+            report_suppressed_exception(exc)
+            self.writer = None
+
+    def write_entry(self, entry):
+        if self.writer is not None:
+            self._call(self.writer.write_entry, entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.writer is not None:
+            self._call(self.writer.close)
 
 
 @exceptions_suppressing_decorator
-def pass_to_pdf(pdf_path, rss_json):
+@stats.timed()
+@exceptions_wrapping_decorator(RssReaderHtmlException, "\nError: Unable to write html-file.")
+def pass_to_html(html_path, rss_json):
+    """
+    Convert rss-news to html file
+    :param html_path: path to html file
+    :param rss_json: data with rss news in json format, entries can be any iterable
+    """
+    with HtmlWriter(html_path) as writer:
+        for entry in rss_json['entries']:
+            writer.write_entry(entry)
+
+
+@exceptions_suppressing_decorator
+@stats.timed()
+@exceptions_wrapping_decorator(RssReaderPdfException, "\nError: Unable to write pdf-file.")
+def pass_to_pdf(pdf_path, rss_json, split_size=None, workers=None):
     """
     Convert rss-news to pdf file
     :param pdf_path: path to html file
-    :param rss_json: data with rss news in json format
+    :param rss_json: data with rss news in json format, entries can be any iterable
+    :param split_size: if it is given, write every split_size entries to a separate file in parallel
+    :param workers: number of worker processes for the split export
     """
-    try:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.add_font('DejaVu', fname='data/DejaVuSerif-Bold.ttf')
-        pdf.set_font('DejaVu', size=14)
-
+    writer = PdfWriter(pdf_path) if split_size is None else SplitPdfWriter(pdf_path, split_size, workers)
+    with writer:
         for entry in rss_json['entries']:
-            keys_entry = entry.keys()
-            pdf.write(txt=f"\n\nFeed: {entry['feed']}")
-            pdf.write(txt=f"\n\nTitle: {entry['title']}")
-            pdf.write(txt=f"\n\nDate: {entry['date']}")
-            if "summary" in keys_entry:
-                pdf.write(txt=f"\n\nSummary: {entry['summary']}")
-            pdf.write(txt=f"\n\n")
-            pdf.cell(txt="See more details ...", border=1, align="C", link=f"{entry['link']}")
-            pdf.write(txt=f"\n\n\n--------------------------")
-        pdf.output(pdf_path)
-    except Exception as exc:
-        print(f"\nError: Unable to write pdf-file.")
-        raise RssReaderPdfException(exc.__str__())
-
+            writer.write_entry(entry)